@@ -0,0 +1,148 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from utility.helper_functions import get_output_directory
+from utility.line_store import get_line_store
+from utility.logging_utils import create_logger
+
+
+logger = create_logger(name=__name__)
+
+# Columns identifying a single two-way market, the same on every book
+MARKET_KEYS = ["event_key", "bet_type", "market_line"]
+
+# Columns describing the event of a market, carried over once per pair
+EVENT_COLUMNS = ["event_date", "away_team", "home_team", "home_team_key"]
+
+# Columns carried over from each side of a pair
+LINE_COLUMNS = ["website", "event_id", "team", "team_key", "over_under", "handicap_spread", "decimal_line"]
+
+# The side of each market that is paired with the opposite side
+FIRST_SIDES = ("home", "over")
+SECOND_SIDES = ("away", "under")
+
+
+def prepare_lines(df_lines: pd.DataFrame):
+    """
+    Add the market_line and side columns used to pair up opposite sides of the same market
+
+    market_line is the handicap from the home team's perspective, so that away -3.5 and home +3.5 share a market,
+    the total for over/under and 0 for moneylines. side is home/away for team markets and over/under for totals
+
+    :param df_lines: dataframe of lines in the shape produced by create_df_with_lines, from one or more books
+    :return: dataframe of the lines with a valid decimal price and the two extra columns
+    """
+
+    df_lines = df_lines.assign(decimal_line=pd.to_numeric(df_lines["decimal_line"], errors="coerce"),
+                               handicap_spread=pd.to_numeric(df_lines["handicap_spread"], errors="coerce"))
+    df_lines = df_lines[df_lines["decimal_line"] > 1]
+
+    bet_type = df_lines["bet_type"].to_numpy(dtype=object)
+    is_home = df_lines["team_key"].to_numpy() == df_lines["home_team_key"].to_numpy()
+    handicap_spread = df_lines["handicap_spread"].to_numpy(dtype=np.float64)
+
+    market_line = np.where(
+        bet_type == "moneyline",
+        0.0,
+        np.where((bet_type == "handicap") & ~is_home, -handicap_spread, handicap_spread)
+    )
+    side = np.where(
+        bet_type == "over_under",
+        df_lines["over_under"].to_numpy(dtype=object),
+        np.where(is_home, "home", "away")
+    )
+
+    return df_lines.assign(market_line=market_line, side=side)
+
+
+def best_prices(df_lines: pd.DataFrame):
+    """
+    Keep the line with the highest decimal price on each side of each market, across every book
+
+    :param df_lines: dataframe of lines from prepare_lines, with all books in one long table
+    :return: dataframe with one line per market and side
+    """
+
+    group_keys = MARKET_KEYS + ["side"]
+    best_index = df_lines.groupby(group_keys, sort=False, observed=True)["decimal_line"].idxmax()
+
+    return df_lines.loc[best_index.to_numpy(), group_keys + EVENT_COLUMNS + LINE_COLUMNS]
+
+
+def find_arbitrage(
+        dfs_bet_info: list,
+        total_stake: float=100.0,
+        min_margin: float=0.0
+):
+    """
+    Find every market whose best prices on each side, taken across all books, lock in a profit
+
+    Only the best price of each side can take part in an arbitrage, so the books are reduced to one line per
+    side with a single grouped max before the two sides are paired. The cost grows linearly with the number of books.
+
+    Backing side 1 at decimal price d1 and side 2 at d2 is an arbitrage when 1/d1 + 1/d2 < 1.
+    Staking total_stake * (1/d) / (1/d1 + 1/d2) on each side returns total_stake / (1/d1 + 1/d2) whichever side wins
+
+    :param dfs_bet_info: list of dataframes with lines, one per book, as produced by create_df_with_lines
+    :param total_stake: amount staked across both sides of an opportunity
+    :param min_margin: only opportunities with a margin (1 - implied probability) above this are returned
+    :return: dataframe of opportunities sorted by margin, highest first
+    """
+
+    dfs_bet_info = [df_bet_info for df_bet_info in dfs_bet_info if df_bet_info is not None and len(df_bet_info) > 0]
+    if len(dfs_bet_info) == 0:
+        return pd.DataFrame()
+
+    # Book specific categories would not survive the concat, so use plain values.
+    # Markets are matched on the integer event_key, the same for every book, instead of team name strings
+    df_lines = pd.concat(
+        [df_bet_info[["event_key", "bet_type"] + EVENT_COLUMNS + LINE_COLUMNS].astype({"event_date": object, "bet_type": object})
+         for df_bet_info in dfs_bet_info],
+        ignore_index=True
+    )
+    df_best = best_prices(prepare_lines(df_lines))
+
+    df_pairs = pd.merge(
+        df_best[df_best["side"].isin(FIRST_SIDES)],
+        df_best.loc[df_best["side"].isin(SECOND_SIDES), MARKET_KEYS + ["side"] + LINE_COLUMNS],
+        how="inner",
+        on=MARKET_KEYS,
+        suffixes=("_1", "_2")
+    )
+
+    implied_probability_1 = 1 / df_pairs["decimal_line_1"].to_numpy(dtype=np.float64)
+    implied_probability_2 = 1 / df_pairs["decimal_line_2"].to_numpy(dtype=np.float64)
+    implied_probability = implied_probability_1 + implied_probability_2
+    margin = 1 - implied_probability
+
+    df_pairs = df_pairs.assign(
+        implied_probability=implied_probability,
+        margin=margin,
+        stake_1=total_stake * implied_probability_1 / implied_probability,
+        stake_2=total_stake * implied_probability_2 / implied_probability,
+        profit=total_stake / implied_probability - total_stake
+    )
+
+    df_arbitrage = df_pairs[margin > min_margin].sort_values("margin", ascending=False, ignore_index=True)
+    logger.info(f"{len(df_arbitrage)} arbitrage opportunities out of {len(df_pairs)} markets from {len(dfs_bet_info)} books")
+
+    return df_arbitrage
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--websites", dest="websites", nargs="+", default=["bovada", "betfair"],
+                        help="Websites whose latest stored lines are compared")
+    parser.add_argument("--sport", dest="sport", type=str, default="basketball",
+                        help="Sport of the lines")
+    parser.add_argument("--total-stake", dest="total_stake", type=float, default=100.0,
+                        help="Amount staked across both sides of an opportunity")
+    args = parser.parse_args()
+
+    output_directory = get_output_directory()
+    line_store = get_line_store()
+    dfs_bet_info = [line_store.read_latest(website, args.sport) for website in args.websites]
+
+    df_arbitrage = find_arbitrage(dfs_bet_info, args.total_stake)
+    df_arbitrage.to_csv(os.path.join(output_directory, "arbitrage.csv"), index=False)
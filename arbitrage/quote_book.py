@@ -0,0 +1,207 @@
+import threading
+import pandas as pd
+from arbitrage.arbitrage import prepare_lines, MARKET_KEYS, EVENT_COLUMNS, LINE_COLUMNS, FIRST_SIDES, SECOND_SIDES
+from utility.logging_utils import create_logger
+
+
+logger = create_logger(name=__name__)
+
+
+class QuoteBook:
+    def __init__(
+            self,
+            total_stake: float=100.0,
+            min_margin: float=0.0
+    ):
+        """
+        Long lived book of the latest quote of every (market, side, website), with the arbitrage opportunities
+        re-evaluated only for the markets whose quotes changed since the last evaluation
+
+        :param total_stake: amount staked across both sides of an opportunity
+        :param min_margin: only opportunities with a margin (1 - implied probability) above this are kept
+        """
+
+        self.total_stake = total_stake
+        self.min_margin = min_margin
+
+        # (event_key, bet_type, market_line) to {"event": event columns, "sides": {side: {website: line columns}}}
+        self.markets = {}
+        # (website, sport) to the set of (market, side) it quoted in its last update
+        self.website_quote_keys = {}
+        # Markets with a quote added, changed or removed since the last evaluation
+        self.dirty_markets = set()
+        # market to the current opportunity of the market
+        self.opportunities = {}
+        self.lock = threading.Lock()
+
+    def update(
+            self,
+            df_bet_info: pd.DataFrame,
+            website: str=None,
+            sport: str=None
+    ):
+        """
+        Apply a new parse of one or more websites
+
+        Every website / sport in the dataframe (and website / sport, if given) is treated as fully refreshed,
+        so its quotes that are not in the dataframe any more are removed. The quotes of the other sports of
+        the website are kept, since each sport is parsed by its own job
+
+        :param df_bet_info: dataframe with lines as produced by create_df_with_lines
+        :param website: website the dataframe was parsed from, needed to clear a website whose parse had no lines
+        :param sport: sport the dataframe was parsed for, None when the dataframe covers every sport of its websites
+        :return: number of markets marked dirty
+        """
+
+        df_lines = prepare_lines(df_bet_info[["event_key", "bet_type"] + EVENT_COLUMNS + LINE_COLUMNS])
+
+        market_columns = [df_lines[column].to_numpy(dtype=object) for column in MARKET_KEYS]
+        event_columns = [df_lines[column].to_numpy(dtype=object) for column in EVENT_COLUMNS]
+        line_columns = [df_lines[column].to_numpy(dtype=object) for column in LINE_COLUMNS]
+        sides = df_lines["side"].to_numpy(dtype=object)
+
+        seen_quote_keys = {} if website is None else {(website, sport): set()}
+        dirty_markets = set()
+
+        with self.lock:
+            for market, side, event_values, line_values in zip(zip(*market_columns), sides, zip(*event_columns), zip(*line_columns)):
+                line = dict(zip(LINE_COLUMNS, line_values))
+                quote_key = (market, side)
+                website_seen_quote_keys = seen_quote_keys.setdefault((line["website"], sport), set())
+
+                market_entry = self.markets.get(market)
+                if market_entry is None:
+                    market_entry = self.markets[market] = {"event": dict(zip(EVENT_COLUMNS, event_values)), "sides": {}}
+                website_lines = market_entry["sides"].setdefault(side, {})
+                previous_line = website_lines.get(line["website"])
+
+                # A website quoting the same side more than once keeps its best price
+                if quote_key in website_seen_quote_keys and previous_line["decimal_line"] >= line["decimal_line"]:
+                    continue
+                website_seen_quote_keys.add(quote_key)
+
+                if previous_line is None or previous_line["decimal_line"] != line["decimal_line"]:
+                    dirty_markets.add(market)
+                website_lines[line["website"]] = line
+
+            for (website, sport), website_seen_quote_keys in seen_quote_keys.items():
+                for market, side in self.website_quote_keys.get((website, sport), set()) - website_seen_quote_keys:
+                    del self.markets[market]["sides"][side][website]
+                    dirty_markets.add(market)
+                self.website_quote_keys[(website, sport)] = website_seen_quote_keys
+
+            self.dirty_markets |= dirty_markets
+
+        logger.info(f"Quote book update from {list(seen_quote_keys)} : {len(df_lines)} lines, {len(dirty_markets)} markets changed")
+
+        return len(dirty_markets)
+
+    def best_line(
+            self,
+            market_entry: dict,
+            sides: tuple
+    ):
+        """
+        Retrieve the highest priced line across websites for whichever of the given sides the market has
+
+        :param market_entry: entry of self.markets
+        :param sides: FIRST_SIDES or SECOND_SIDES
+        :return: (side, line) or (None, None) if no website quotes the sides
+        """
+
+        for side in sides:
+            website_lines = market_entry["sides"].get(side)
+            if website_lines:
+                return side, max(website_lines.values(), key=lambda line: line["decimal_line"])
+
+        return None, None
+
+    def evaluate_market(
+            self,
+            market: tuple
+    ):
+        """
+        Evaluate arbitrage on the best prices of a single market
+
+        :param market: (event_key, bet_type, market_line)
+        :return: dict with the same fields as a row of find_arbitrage, or None if there is no opportunity
+        """
+
+        market_entry = self.markets.get(market)
+        if market_entry is None:
+            return None
+
+        side_1, line_1 = self.best_line(market_entry, FIRST_SIDES)
+        side_2, line_2 = self.best_line(market_entry, SECOND_SIDES)
+        if line_1 is None or line_2 is None:
+            if line_1 is None and line_2 is None:
+                # Every website stopped quoting the market
+                del self.markets[market]
+            return None
+
+        implied_probability_1 = 1 / line_1["decimal_line"]
+        implied_probability_2 = 1 / line_2["decimal_line"]
+        implied_probability = implied_probability_1 + implied_probability_2
+        margin = 1 - implied_probability
+        if margin <= self.min_margin:
+            return None
+
+        return {
+            **dict(zip(MARKET_KEYS, market)),
+            "side_1": side_1,
+            **market_entry["event"],
+            **{f"{column}_1": value for column, value in line_1.items()},
+            "side_2": side_2,
+            **{f"{column}_2": value for column, value in line_2.items()},
+            "implied_probability": implied_probability,
+            "margin": margin,
+            "stake_1": self.total_stake * implied_probability_1 / implied_probability,
+            "stake_2": self.total_stake * implied_probability_2 / implied_probability,
+            "profit": self.total_stake / implied_probability - self.total_stake
+        }
+
+    def evaluate(self):
+        """
+        Re-evaluate arbitrage for the markets that changed since the last evaluation
+
+        :return: list of the opportunities that are new or whose prices changed, and list of the markets whose
+            opportunity closed
+        """
+
+        with self.lock:
+            dirty_markets = self.dirty_markets
+            self.dirty_markets = set()
+
+            changed_opportunities = []
+            closed_markets = []
+            for market in dirty_markets:
+                opportunity = self.evaluate_market(market)
+                if opportunity is None:
+                    if self.opportunities.pop(market, None) is not None:
+                        logger.info(f"Arbitrage closed : {market}")
+                        closed_markets.append(market)
+                else:
+                    self.opportunities[market] = opportunity
+                    changed_opportunities.append(opportunity)
+
+        logger.info(
+            f"Evaluated {len(dirty_markets)} changed markets : {len(changed_opportunities)} new or changed opportunities, "
+            f"{len(closed_markets)} closed, {len(self.opportunities)} open"
+        )
+
+        return changed_opportunities, closed_markets
+
+    def opportunities_df(self):
+        """
+        Current opportunities in the shape returned by find_arbitrage
+
+        :return: dataframe of opportunities sorted by margin, highest first
+        """
+
+        with self.lock:
+            opportunities = list(self.opportunities.values())
+
+        if len(opportunities) == 0:
+            return pd.DataFrame()
+
+        return pd.DataFrame(opportunities).sort_values("margin", ascending=False, ignore_index=True)
@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from utility.logging_utils import configure_logging
+from utility.helper_functions import (
+    get_base_directory, create_directory, read_json_file, read_html_data, iter_json_array, BASE_DIRECTORY_ENVIRONMENT_VARIABLE
+)
+from bovada.bovada import Bovada
+from betfair.betfair import Betfair, get_strainer
+from benchmarks.synthetic_fixtures import create_bovada_all_games, write_bovada_all_games, create_betfair_pages
+
+
+def measure(
+        function,
+        repeat: int
+):
+    """
+    Measure the best wall time over repeat runs, then the peak traced memory of one more run
+
+    Memory is measured separately since tracemalloc slows the code down
+
+    :param function: function without arguments to benchmark, returning the number of records produced
+    :param repeat: number of timed runs
+    :return: dict with seconds, records and peak_memory_bytes
+    """
+
+    seconds = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        records = function()
+        seconds.append(time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    function()
+    _, peak_memory_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "seconds": min(seconds),
+        "records": records,
+        "peak_memory_bytes": peak_memory_bytes
+    }
+
+
+def create_benchmarks(
+        events: int,
+        alternate_lines: int,
+        directory: str
+):
+    """
+    Create the fixtures for a given scale and the benchmark functions that use them
+
+    :param events: number of events in the fixtures
+    :param alternate_lines: number of alternate spreads and of alternate totals per Bovada event
+    :param directory: directory the fixtures are written to
+    :return: dict of benchmark name to function without arguments returning the number of records produced
+    """
+
+    bovada = Bovada("basketball")
+    bets_json_data = create_bovada_all_games(events, alternate_lines)
+    bovada_file_path = write_bovada_all_games(events, os.path.join(directory, "bovada"), alternate_lines)
+
+    betfair = Betfair("basketball")
+    betfair_directory = os.path.join(directory, "betfair")
+    create_betfair_pages(events, betfair_directory)
+    betfair_coupon_file_path = os.path.join(betfair_directory, "all_games.txt")
+    all_games_soup = read_html_data(betfair_coupon_file_path, get_strainer("coupon_line"), betfair.html_parser)
+
+    # Same events with their prices on the coupon, so that no event page is needed
+    betfair_priced_coupon_directory = os.path.join(directory, "betfair_priced_coupon")
+    create_betfair_pages(events, betfair_priced_coupon_directory, coupon_markets=True)
+    priced_coupon_soup = read_html_data(
+        os.path.join(betfair_priced_coupon_directory, "all_games.txt"), get_strainer("coupon_line"), betfair.html_parser
+    )
+
+    # Same again with the runners of the coupon markets labelled and in the reverse order
+    betfair_reversed_coupon_directory = os.path.join(directory, "betfair_reversed_coupon")
+    create_betfair_pages(events, betfair_reversed_coupon_directory, coupon_markets=True, reversed_runners=True)
+    reversed_coupon_soup = read_html_data(
+        os.path.join(betfair_reversed_coupon_directory, "all_games.txt"), get_strainer("coupon_line"), betfair.html_parser
+    )
+
+    return {
+        "bovada_read_json": lambda: sum(len(competition["events"]) for competition in read_json_file(bovada_file_path)),
+        # Decodes the file too, so that it compares with the streaming benchmark which reads the file itself
+        "bovada_extract_bet_data_from_json": lambda: len(bovada.extract_bet_data_from_json(
+            read_json_file(bovada_file_path), directory)[1]),
+        "bovada_extract_bet_data_streaming": lambda: len(bovada.extract_bet_data_from_json(
+            iter_json_array(bovada_file_path, must_contain=("/basketball/nba",)), directory)[1]),
+        "bovada_create_df": lambda: len(bovada.create_df_bovada(bets_json_data, directory)),
+        "betfair_parse_coupon": lambda: len(read_html_data(betfair_coupon_file_path, get_strainer("coupon_line"), betfair.html_parser)
+                                            .find_all("li", class_="com-coupon-line-new-layout")),
+        "betfair_extract_bet_data_from_html": lambda: len(betfair.extract_bet_data_from_html(
+            all_games_soup.find_all("li", class_="com-coupon-line-new-layout"), betfair_directory, "", replay=True)[1]),
+        "betfair_create_df": lambda: len(betfair.create_df_betfair(all_games_soup, betfair_directory, "", replay=True)),
+        "betfair_extract_coupon_prices": lambda: len(betfair.extract_bet_data_from_html(
+            priced_coupon_soup.find_all("li", class_="com-coupon-line-new-layout"), betfair_priced_coupon_directory, "",
+            replay=True)[1]),
+        "betfair_extract_reversed_coupon_prices": lambda: len(betfair.extract_bet_data_from_html(
+            reversed_coupon_soup.find_all("li", class_="com-coupon-line-new-layout"), betfair_reversed_coupon_directory, "",
+            replay=True)[1])
+    }
+
+
+def run_benchmarks(
+        scales: list,
+        alternate_lines: int,
+        repeat: int,
+        benchmark_filter: str=None
+):
+    """
+    Run every benchmark at every scale
+
+    :param scales: list of number of events
+    :param alternate_lines: number of alternate spreads and of alternate totals per Bovada event
+    :param repeat: number of timed runs of each benchmark
+    :param benchmark_filter: only run benchmarks whose name contains this string
+    :return: dict of scale to benchmark name to measurements
+
+    The code under test writes under a temporary base directory (e.g. the team index with the synthetic teams),
+    never under the real one
+    """
+
+    base_directory = tempfile.mkdtemp(prefix="sports_betting_benchmark_")
+    previous_base_directory = os.environ.get(BASE_DIRECTORY_ENVIRONMENT_VARIABLE)
+    os.environ[BASE_DIRECTORY_ENVIRONMENT_VARIABLE] = base_directory
+
+    results = {}
+    try:
+        for events in scales:
+            directory = os.path.join(base_directory, f"fixtures_{events}")
+            benchmarks = create_benchmarks(events, alternate_lines, directory)
+            results[str(events)] = {}
+            for name, function in benchmarks.items():
+                if benchmark_filter is not None and benchmark_filter not in name:
+                    continue
+
+                measurement = measure(function, repeat)
+                measurement["events_per_second"] = events / measurement["seconds"]
+                measurement["records_per_second"] = measurement["records"] / measurement["seconds"]
+                results[str(events)][name] = measurement
+                print(
+                    f"{events:>6} events | {name:<40} | {measurement['seconds'] * 1000:>10.2f} ms | "
+                    f"{measurement['records_per_second']:>12.0f} records/s | {measurement['peak_memory_bytes'] / 1e6:>8.2f} MB"
+                )
+    finally:
+        if previous_base_directory is None:
+            del os.environ[BASE_DIRECTORY_ENVIRONMENT_VARIABLE]
+        else:
+            os.environ[BASE_DIRECTORY_ENVIRONMENT_VARIABLE] = previous_base_directory
+        shutil.rmtree(base_directory)
+
+    return results
+
+
+def compare_to_baseline(
+        results: dict,
+        baseline: dict
+):
+    """
+    Print the time and memory of every benchmark relative to the baseline
+
+    :param results: results of the current run
+    :param baseline: results of the baseline run
+    :return: None
+    """
+
+    for events, benchmarks in results.items():
+        for name, measurement in benchmarks.items():
+            baseline_measurement = baseline.get("results", {}).get(events, {}).get(name)
+            if baseline_measurement is None:
+                continue
+
+            print(
+                f"{events:>6} events | {name:<40} | time x{measurement['seconds'] / baseline_measurement['seconds']:.2f} | "
+                f"memory x{measurement['peak_memory_bytes'] / max(baseline_measurement['peak_memory_bytes'], 1):.2f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", dest="scales", nargs="+", type=int, default=[10, 100, 1000],
+                        help="Numbers of events to generate fixtures for (10 to 10000)")
+    parser.add_argument("--alternate-lines", dest="alternate_lines", type=int, default=3,
+                        help="Number of alternate spreads and of alternate totals per Bovada event")
+    parser.add_argument("--repeat", dest="repeat", type=int, default=3,
+                        help="Number of timed runs of each benchmark")
+    parser.add_argument("--filter", dest="benchmark_filter", type=str, default=None,
+                        help="Only run benchmarks whose name contains this string")
+    parser.add_argument("--save-baseline", dest="save_baseline", action="store_true",
+                        help="Save the results as the baseline that later runs are compared to")
+    args = parser.parse_args()
+
+    # Keep the logging of the code under test out of the measurements
+    configure_logging(level="WARNING", use_queue=False)
+
+    results = run_benchmarks(args.scales, args.alternate_lines, args.repeat, args.benchmark_filter)
+
+    # Results are kept under the real base directory so that later runs can be compared to them
+    benchmarks_directory = os.path.join(get_base_directory(), "benchmarks")
+    create_directory(benchmarks_directory, False)
+    run = {
+        "run_at": datetime.now().isoformat(),
+        "alternate_lines": args.alternate_lines,
+        "results": results
+    }
+
+    results_file_path = os.path.join(benchmarks_directory, f"{datetime.now().strftime('%Y%m%d%H%M%S')}.json")
+    with open(results_file_path, "w") as f:
+        f.write(json.dumps(run, indent=2))
+    print(f"Results written to {results_file_path}")
+
+    baseline_file_path = os.path.join(benchmarks_directory, "baseline.json")
+    if args.save_baseline is True:
+        shutil.copyfile(results_file_path, baseline_file_path)
+        print(f"Baseline saved to {baseline_file_path}")
+    elif os.path.exists(baseline_file_path):
+        compare_to_baseline(results, read_json_file(baseline_file_path))
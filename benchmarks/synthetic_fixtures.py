@@ -0,0 +1,328 @@
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+
+def bovada_outcome(
+        description: str,
+        rng: random.Random,
+        handicap: float=None,
+        status: str="O"
+):
+    """
+    Create a single Bovada outcome with a random price
+
+    :param description: team name, Over or Under
+    :param rng: random number generator
+    :param handicap: handicap / total of the outcome, None for moneylines
+    :param status: O for open, S for suspended
+    :return: dict in the shape of the Bovada API outcome
+    """
+
+    decimal = round(rng.uniform(1.3, 3.5), 2)
+    american = round((decimal - 1) * 100) if decimal >= 2 else round(-100 / (decimal - 1))
+    price = {
+        "american": f"+{american}" if american > 0 else str(american),
+        "decimal": str(decimal),
+        "fractional": f"{round((decimal - 1) * 100)}/100"
+    }
+    if handicap is not None:
+        price["handicap"] = f"{handicap:+.1f}" if description not in ("Over", "Under") else f"{handicap:.1f}"
+
+    return {
+        "description": description,
+        "status": status,
+        "price": price
+    }
+
+
+def bovada_market(
+        description_key: str,
+        description: str,
+        outcomes: list,
+        period: str="Game",
+        live: bool=False
+):
+    """
+    Create a single Bovada market
+
+    :param description_key: descriptionKey of the market
+    :param description: description of the market
+    :param outcomes: list of outcomes
+    :param period: period of the market, only Game markets are parsed
+    :param live: True if the event is in play
+    :return: dict in the shape of the Bovada API market
+    """
+
+    return {
+        "descriptionKey": description_key,
+        "description": description,
+        "period": {
+            "description": period,
+            "live": live
+        },
+        "outcomes": outcomes
+    }
+
+
+def bovada_event(
+        event_number: int,
+        rng: random.Random,
+        alternate_lines: int
+):
+    """
+    Create a single Bovada event with game lines and alternate lines
+
+    :param event_number: number of the event, used for the id and team names
+    :param rng: random number generator
+    :param alternate_lines: number of alternate spreads and of alternate totals
+    :return: dict in the shape of the Bovada API event
+    """
+
+    away_team = f"Away Team {event_number}"
+    home_team = f"Home Team {event_number}"
+    spread = rng.choice([1.5, 2.5, 3.5, 4.5, 5.5, 6.5, 7.5])
+    total = rng.choice([210.5, 215.5, 220.5, 225.5, 230.5])
+    start_time = datetime.now() + timedelta(hours=rng.randint(1, 48))
+
+    game_lines = [
+        bovada_market("Head To Head", "Moneyline", [
+            bovada_outcome(away_team, rng),
+            bovada_outcome(home_team, rng)
+        ]),
+        bovada_market("Main Dynamic Asian Runline", "Runline", [
+            bovada_outcome(away_team, rng, -spread),
+            bovada_outcome(home_team, rng, spread)
+        ]),
+        bovada_market("Main Dynamic Over/Under", "Total", [
+            bovada_outcome("Over", rng, total),
+            bovada_outcome("Under", rng, total),
+            bovada_outcome("Over", rng, total, "S")
+        ]),
+        bovada_market("Head To Head", "Moneyline", [
+            bovada_outcome(away_team, rng),
+            bovada_outcome(home_team, rng)
+        ], period="First Half")
+    ]
+
+    alternate = []
+    for i in range(1, alternate_lines + 1):
+        alternate.append(bovada_market("Handicap - Asian", "Spread", [
+            bovada_outcome(away_team, rng, -spread - i),
+            bovada_outcome(home_team, rng, spread + i)
+        ]))
+        alternate.append(bovada_market("Total Runs O/U", "Total Runs O/U", [
+            bovada_outcome("Over", rng, total + i),
+            bovada_outcome("Under", rng, total + i)
+        ]))
+
+    return {
+        "id": str(10000000 + event_number),
+        "startTime": int(start_time.timestamp() * 1000),
+        "competitors": [
+            {"home": False, "name": away_team},
+            {"home": True, "name": home_team}
+        ],
+        "displayGroups": [
+            {"description": "Game Lines", "markets": game_lines},
+            {"description": "Alternate Lines", "markets": alternate},
+            {"description": "Player Props", "markets": [
+                bovada_market("Player Points", "Points", [bovada_outcome("Over", rng, 25.5)])
+            ]}
+        ]
+    }
+
+
+def create_bovada_all_games(
+        events: int,
+        alternate_lines: int=3,
+        seed: int=0
+):
+    """
+    Create a synthetic Bovada all_games.txt payload with an NBA competition and a few other leagues
+
+    :param events: number of NBA events
+    :param alternate_lines: number of alternate spreads and of alternate totals per event
+    :param seed: seed of the random number generator
+    :return: list of competitions in the shape of the Bovada API response
+    """
+
+    rng = random.Random(seed)
+
+    return [
+        {"path": [{"link": "/basketball/wnba"}], "events": [bovada_event(events + 1, rng, alternate_lines)]},
+        {"path": [{"link": "/basketball/nba"}], "events": [bovada_event(i, rng, alternate_lines) for i in range(events)]},
+        {"path": [{"link": "/basketball/euroleague"}], "events": [bovada_event(events + 2, rng, alternate_lines)]}
+    ]
+
+
+def betfair_minimarket(
+        bet_type: str,
+        event_id: str,
+        runners: list,
+        rng: random.Random
+):
+    """
+    Create the html of a single Betfair minimarket
+
+    :param bet_type: bet type of the minimarket, e.g. MONEY_LINE
+    :param event_id: id of the event
+    :param runners: list of (runner name, handicap) tuples, handicap is None for moneylines
+    :param rng: random number generator
+    :return: html string
+    """
+
+    runner_lines = []
+    for runner_name, handicap in runners:
+        handicap_html = f'<span class="ui-runner-handicap">{handicap}</span>' if handicap is not None else ""
+        runner_lines.append(
+            f'<li class="runner-line"><span class="runner-name">{runner_name}</span>{handicap_html}'
+            f'<a class="ui-betbutton"><span class="ui-runner-price">\n{rng.uniform(1.3, 3.5):.2f}\n</span></a></li>'
+        )
+
+    return (
+        f'<div class="mod-minimarketview minimarket-{bet_type}-{event_id} ui-market">'
+        f'<div class="minimarket-header"><span>{bet_type}</span></div>'
+        f'<ul class="runner-list">{"".join(runner_lines)}</ul></div>'
+    )
+
+
+def betfair_coupon_market(
+        runners: list,
+        rng: random.Random
+):
+    """
+    Create the html of a single market column of a Betfair coupon line
+
+    :param runners: list of (runner name, handicap) tuples of the two runners, the runner name is None when the
+        coupon does not show it and the handicap is None for moneylines
+    :param rng: random number generator
+    :return: html string
+    """
+
+    runner_buttons = []
+    for runner_name, handicap in runners:
+        runner_name_html = f'<span class="runner-name">{runner_name}</span>' if runner_name is not None else ""
+        handicap_html = f'<span class="ui-runner-handicap">{handicap}</span>' if handicap is not None else ""
+        runner_buttons.append(
+            f'<li class="selection">{runner_name_html}{handicap_html}'
+            f'<a class="com-bet-button"><span class="ui-runner-price">{rng.uniform(1.3, 3.5):.2f}</span></a></li>'
+        )
+
+    return f'<div class="details-market market-2-runners"><ul class="runner-list-selections">{"".join(runner_buttons)}</ul></div>'
+
+
+def create_betfair_pages(
+        events: int,
+        directory: str,
+        filler_blocks: int=200,
+        coupon_markets: bool=False,
+        reversed_runners: bool=False,
+        seed: int=0
+):
+    """
+    Write a synthetic Betfair coupon page (all_games.txt) and one event page per event
+
+    Event page file names follow Betfair.extract_bet_data_from_html
+
+    :param events: number of NBA events
+    :param directory: directory the pages are written to
+    :param filler_blocks: number of unrelated html blocks around the markets, to mimic the real page size
+    :param coupon_markets: True to also show the moneyline, handicap and total prices on the coupon lines
+    :param reversed_runners: True to show the home team / under first on the coupon lines, labelled with the
+        team names and an O / U in front of the totals, instead of the unlabelled away team / over first
+    :param seed: seed of the random number generator
+    :return: list of event page file paths
+    """
+
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    promo_blocks = [
+        f'<div class="promo-block"><h3>Promotion {i}</h3><p>Lorem ipsum <a href="/promo/{i}">dolor</a> sit amet</p></div>'
+        for i in range(filler_blocks)
+    ]
+    filler = "".join(promo_blocks)
+
+    coupon_lines = []
+    event_page_file_paths = []
+    for i in range(events):
+        event_id = str(32000000 + i)
+        away_team = f"Away Team {i}"
+        home_team = f"Home Team {i}"
+        tomorrow = i % 2 == 1
+        countdown = "Tomorrow 01:00" if tomorrow else f"Starting in {rng.randint(5, 59)}'"
+        event_date = str(datetime.today().date() + timedelta(days=1 if tomorrow else 0))
+
+        spread = rng.choice([1.5, 2.5, 3.5, 4.5, 5.5])
+        total = rng.choice([210.5, 215.5, 220.5, 225.5])
+
+        if coupon_markets is True and reversed_runners is True:
+            markets_html = "".join([
+                betfair_coupon_market([(home_team, None), (away_team, None)], rng),
+                betfair_coupon_market([(home_team, f"+{spread}"), (away_team, f"-{spread}")], rng),
+                betfair_coupon_market([(None, f"U {total}"), (None, f"O {total}")], rng)
+            ])
+        elif coupon_markets is True:
+            markets_html = "".join([
+                betfair_coupon_market([(None, None), (None, None)], rng),
+                betfair_coupon_market([(None, f"-{spread}"), (None, f"+{spread}")], rng),
+                betfair_coupon_market([(None, f"{total}"), (None, f"{total}")], rng)
+            ])
+        else:
+            markets_html = "".join(promo_blocks[:5])
+
+        coupon_lines.append(
+            f'<li class="com-coupon-line-new-layout betbutton-layout avb-row avb-table market-avb">'
+            f'<div class="avb-col avb-col-runners">'
+            f'<a href="/sport/basketball/nba/{away_team.lower().replace(" ", "-")}-{home_team.lower().replace(" ", "-")}/{event_id}" '
+            f'data-competition="NBA" data-event="{away_team} @ {home_team}">'
+            f'<span class="team-name">{away_team}</span><span class="team-name">{home_team}</span></a>'
+            f'<span class="date ui-countdown">{countdown}</span></div>'
+            f'<div class="avb-col avb-col-markets">{markets_html}</div></li>'
+        )
+
+        minimarkets = [
+            betfair_minimarket("MONEY_LINE", event_id, [(away_team, None), (home_team, None)], rng),
+            betfair_minimarket("MATCH_ODDS_HANDICAP", event_id, [(away_team, f"-{spread}"), (home_team, f"+{spread}")], rng),
+            betfair_minimarket("OVERUNDER_POINTS", event_id, [("Over", f"{total}"), ("Under", f"{total}")], rng)
+        ]
+
+        file_name = f"{event_date.replace('-', '')}-{event_id}-{away_team}-{home_team}"
+        file_path = os.path.join(directory, file_name)
+        with open(file_path, "w") as f:
+            f.write(
+                f'<html><head><title>{away_team} @ {home_team}</title><script>var config = {{}};</script></head>'
+                f'<body>{filler}<div class="event-markets">{"".join(minimarkets)}</div>{filler}</body></html>'
+            )
+        event_page_file_paths.append(file_path)
+
+    with open(os.path.join(directory, "all_games.txt"), "w") as f:
+        f.write(f'<html><body>{filler}<ul class="coupon-list">{"".join(coupon_lines)}</ul>{filler}</body></html>')
+
+    return event_page_file_paths
+
+
+def write_bovada_all_games(
+        events: int,
+        directory: str,
+        alternate_lines: int=3,
+        seed: int=0
+):
+    """
+    Write a synthetic Bovada all_games.txt
+
+    :param events: number of NBA events
+    :param directory: directory the file is written to
+    :param alternate_lines: number of alternate spreads and of alternate totals per event
+    :param seed: seed of the random number generator
+    :return: full file path of all_games.txt
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    file_path = os.path.join(directory, "all_games.txt")
+    with open(file_path, "w") as f:
+        f.write(json.dumps(create_bovada_all_games(events, alternate_lines, seed)))
+
+    return file_path
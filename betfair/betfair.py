@@ -1,17 +1,134 @@
-import requests
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-import time
-import pandas as pd
+import multiprocessing
 import os
-import random
-from pathlib import Path
-from utility.helper_functions import extract_from_url, read_json_file, read_html_data
+import re
+from functools import lru_cache
+from utility.helper_functions import extract_from_url, read_html_data, get_http_cache
 from utility.logging_utils import create_logger
 import argparse
 from utility.sports_betting import SportsBetting
+from utility.metrics import RunMetrics
+from utility.fetch_scheduler import FetchScheduler
+from utility.team_index import get_team_index
+from utility.config import get_config, SearchElem
+from utility.refresh_scheduler import RefreshScheduler
 
 
-logger = create_logger()
+logger = create_logger(name=__name__)
+
+# Only the parts of the pages that are looked at are built into the soup
+# Class filters are regexes since the strainer may see the whole class attribute string while parsing
+COUPON_LINE_CLASS_PATTERN = re.compile(r"(^|\s)com-coupon-line-new-layout(\s|$)")
+MINIMARKET_DIV_CLASS_PATTERN = re.compile("minimarket-")
+
+# Bet type of a minimarket div, e.g. minimarket-MONEY_LINE from class minimarket-MONEY_LINE-12345
+MINIMARKET_CLASS_PATTERN = re.compile(r"(minimarket-[A-Za-z0-9_]+)-")
+
+# Countdown of an event on the coupon, e.g. "Starting in 25'", "19:30" or "Tomorrow 01:00"
+STARTING_IN_PATTERN = re.compile(r"starting in\s*(\d+)", re.IGNORECASE)
+START_TIME_PATTERN = re.compile(r"(\d{1,2}):(\d{2})")
+
+# Over / under label and total of a coupon runner, e.g. "Over", "O 215.5" or "U215.5"
+COUPON_TOTAL_PATTERN = re.compile(r"^\s*(o|over|u|under)?\s*([+-]?\d+(?:\.\d+)?)?\s*$", re.IGNORECASE)
+
+# Fewer event pages than this are parsed in the calling process, where a pool would cost more than it saves
+MIN_EVENT_PAGES_FOR_PROCESS_POOL = 16
+
+# Betfair instance of a parse worker process, created once by init_parse_worker
+_parse_worker_betfair = None
+
+
+@lru_cache(maxsize=None)
+def get_strainer(name: str):
+    """
+    Retrieve a SoupStrainer of the pages, bs4 being imported on first use
+
+    :param name: "coupon_line" for the event lines of the coupon, "minimarket" for the markets of an event page
+    :return: SoupStrainer
+    """
+
+    from bs4 import SoupStrainer
+
+    if name == "coupon_line":
+        return SoupStrainer("li", class_=COUPON_LINE_CLASS_PATTERN)
+
+    return SoupStrainer("div", class_=MINIMARKET_DIV_CLASS_PATTERN)
+
+
+def get_parse_worker_context():
+    """
+    Retrieve the multiprocessing context of the event page parse workers, which are started without forking
+    the calling process
+
+    :return: forkserver context where it is available, spawn context otherwise (e.g. Windows)
+    """
+
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+
+    return multiprocessing.get_context("spawn")
+
+
+def init_parse_worker(sport: str):
+    """
+    Create the Betfair instance used by every event page parsed in this worker process
+
+    :param sport: sport of the event pages
+    :return: None
+    """
+
+    global _parse_worker_betfair
+
+    _parse_worker_betfair = Betfair(sport)
+
+
+def minutes_to_start(
+        countdown_text: str,
+        snapshot_time: datetime
+):
+    """
+    Retrieve the minutes until an event starts from its countdown on the coupon
+
+    :param countdown_text: text of the ui-countdown span of the event
+    :param snapshot_time: when the coupon was downloaded
+    :return: minutes until the event starts (0 if it is due to have started), None if the text is not recognized
+    """
+
+    starting_in = STARTING_IN_PATTERN.search(countdown_text)
+    if starting_in is not None:
+        return float(starting_in.group(1))
+
+    start_time = START_TIME_PATTERN.search(countdown_text)
+    if start_time is None:
+        return None
+
+    start_datetime = snapshot_time.replace(hour=int(start_time.group(1)), minute=int(start_time.group(2)), second=0, microsecond=0)
+    if "Tomorrow" in countdown_text:
+        start_datetime += timedelta(days=1)
+
+    return max((start_datetime - snapshot_time).total_seconds() / 60, 0.0)
+
+
+def parse_event_page_in_worker(
+        event_id: str,
+        file_path: str,
+        search_elems: tuple
+):
+    """
+    Parse a single saved event page in a worker process
+
+    Only the records go back to the parent, as tuples, never the soup
+
+    :param event_id: id of the event
+    :param file_path: full file path of the saved event page
+    :param search_elems: SearchElems of betfair_search_elems.json
+    :return: tuple of record tuples, and list of the bet types not found on the page
+    """
+
+    records, missing_bet_types = _parse_worker_betfair.parse_event_page(event_id, file_path, search_elems)
+
+    return tuple(tuple(record) for record in records), missing_bet_types
 
 
 class Betfair(SportsBetting):
@@ -21,88 +138,411 @@ class Betfair(SportsBetting):
         ):
         super().__init__(sport)
         self.website = "betfair"
-        
+
+        # Settings of betting_sites_info.json, applied by apply_config
+        self.website_config = None
+        self.fetch_scheduler = None
+        self.html_parser = None
+        self.coupon_prices = False
+        self.parse_processes = None
+        self.refresh_scheduler = None
+
+        # Event pages are parsed on a process pool, created on first use and kept for later runs
+        self.parse_executor = None
+
+        self.apply_config()
+
+        # Configured bet types that were missing from the page of each event_id on the last run
+        self.missing_markets = {}
+
+        # Canonical integer keys of teams and events, shared by every website
+        self.team_index = get_team_index()
+
+    def apply_config(self):
+        """
+        Apply the settings of betting_sites_info.json, again whenever the file was reloaded
+
+        The instance is kept for every later run of the process, so it checks the config at the start of each run
+        rather than copying it once
+
+        :return: None
+        """
+
+        website_config = get_config("betting_sites_info.json")[self.website]
+        if website_config is self.website_config:
+            return
+
+        if self.website_config is not None:
+            logger.info(f"Applying the reloaded config of {self.website}")
+
+        # Event pages are downloaded concurrently, throttled per host by a token bucket
+        if self.website_config is None or website_config.event_page_rate_limit != self.website_config.event_page_rate_limit:
+            self.fetch_scheduler = FetchScheduler.from_config(website_config.event_page_rate_limit)
+
+        self.html_parser = website_config.html_parser
+        # Read the prices rendered on the coupon, and event pages only for the markets missing from it
+        self.coupon_prices = website_config.coupon_prices
+        self.parse_processes = website_config.parse_processes or os.cpu_count()
+
+        # Parse workers copied the previous config when they started, so the pool is started again on next use
+        if self.parse_executor is not None:
+            self.parse_executor.shutdown(wait=False)
+            self.parse_executor = None
+
+        # Which event pages are refreshed on each run, and in which order, when a refresh config is set.
+        # What was learnt about the events is kept across config changes
+        if website_config.event_page_refresh is None:
+            self.refresh_scheduler = None
+        elif self.refresh_scheduler is None:
+            self.refresh_scheduler = RefreshScheduler(website_config.event_page_refresh)
+        else:
+            self.refresh_scheduler.refresh_config = website_config.event_page_refresh
+
+        self.website_config = website_config
 
     def bet_type_finder(
             self,
-            single_event_soup: str,
-            bet_type: str,
-            event_id: list
+            elem,
+            bet_type: SearchElem,
+            event_id: str
     ):
         """
-        Find handicap and price info for given bet type
+        Find handicap and price info for given bet type in a single minimarket div
 
-        :param single_event_soup: html for a given game
-        :param bet_type: class within the html to search for
+        :param elem: minimarket div for the bet type
+        :param bet_type: SearchElem of betfair_search_elems.json for the bet type
+        :param event_id: id of the event the minimarket belongs to
         :return: list of lists where each list is a record for the given bet type
         """
 
+        logger.debug("Parsing the element : event_id = %s, bet_type = %s", event_id, bet_type.bet_type)
+
+        # Contains total runs over/under and the spread
+        ui_runner_handicap = [i.text for i in elem.find_all("span", class_="ui-runner-handicap")]
+        logger.debug("\tui_runner_handicap = %s", ui_runner_handicap)
+
+        # Contains total score over/under, spread and moneyline prices
+        ui_runner_price = [i.text.strip("\n") for i in elem.find_all("span", class_="ui-runner-price")]
+        logger.debug("\tui_runner_price = %s", ui_runner_price)
+
+        # Contains teams
+        teams = [i.text for i in elem.find_all("span", class_="runner-name")]
+        logger.debug("\tteams = %s", teams)
+
+        list_of_bet_info = []
+        for i in range(2):
+            # 0 is away team and 1 is home team
+            team = teams[i] if bet_type.has_teams is True else None
+            single_line = [
+                self.website,
+                event_id,
+                bet_type.bet_type_normalized, # bet_type
+                team, # team
+                None,  # american line
+                ui_runner_price[i],  # decimal line
+                None,  # fractional line
+                ui_runner_handicap[i] if bet_type.has_handicap is True else None,  # handicap_spread
+                teams[i].lower() if bet_type.has_teams is False else None, # over_under
+                self.team_index.team_key(team) # team_key
+            ]
+            logger.debug("\tsingle_line = %s", single_line)
+            list_of_bet_info.append(single_line)
+
+        return list_of_bet_info
+
+
+    def minimarket_finder(
+            self,
+            single_event_soup,
+            search_elems: tuple,
+            event_id: str
+    ):
+        """
+        Find handicap and price info for every configured bet type in one pass over the event page
+
+        The first minimarket div of each bet type that parses is used
+
+        :param single_event_soup: html for a given game
+        :param search_elems: SearchElems of betfair_search_elems.json
+        :param event_id: id of the event
+        :return: list of lists where each list is a record, and list of the bet types not found on the page
+        """
+
+        search_elems_by_bet_type = {search_elem.bet_type: search_elem for search_elem in search_elems}
+
+        list_of_bet_info = []
+        found_bet_types = set()
+        for elem in single_event_soup.find_all("div", class_=MINIMARKET_CLASS_PATTERN):
+            for bet_type in MINIMARKET_CLASS_PATTERN.findall(" ".join(elem.get("class", []))):
+                if bet_type not in search_elems_by_bet_type or bet_type in found_bet_types:
+                    continue
+
+                try:
+                    list_of_bet_info.extend(self.bet_type_finder(elem, search_elems_by_bet_type[bet_type], event_id))
+                    found_bet_types.add(bet_type)
+                except IndexError as e:
+                    logger.info(f"Bad {bet_type} record for event_id = {event_id} : {e}")
+
+            if len(found_bet_types) == len(search_elems_by_bet_type):
+                break
+
+        missing_bet_types = [bet_type for bet_type in search_elems_by_bet_type if bet_type not in found_bet_types]
+
+        return list_of_bet_info, missing_bet_types
+
+
+    def parse_event_page(
+            self,
+            event_id: str,
+            file_path: str,
+            search_elems: tuple
+    ):
+        """
+        Parse the minimarkets of a single saved event page
+
+        :param event_id: id of the event
+        :param file_path: full file path of the saved event page
+        :param search_elems: SearchElems of betfair_search_elems.json
+        :return: list of lists where each list is a record, and list of the bet types not found on the page
+        """
+
+        single_event_soup = read_html_data(
+            file_path=file_path,
+            parse_only=get_strainer("minimarket"),
+            html_parser=self.html_parser
+        )
+
+        return self.minimarket_finder(single_event_soup, search_elems, event_id)
+
+
+    def coupon_market_finder(
+            self,
+            coupon_line,
+            search_elems: tuple,
+            event_id: str,
+            away_team: str,
+            home_team: str
+    ):
+        """
+        Read the prices already rendered in the market columns of a coupon line
+
+        Each market is a details-market div of the avb-col-markets column, in the coupon_column order of
+        betfair_search_elems.json. The runners are matched to the teams / over and under by their labels where the
+        coupon shows them, see coupon_runner_order, and are otherwise taken as away team / over first. A market
+        without two prices (e.g. suspended) or whose labels do not match the event is missing and has to be read
+        from the event page
+
+        :param coupon_line: li element of the event on the coupon
+        :param search_elems: SearchElems of betfair_search_elems.json
+        :param event_id: id of the event
+        :param away_team: away team of the event
+        :param home_team: home team of the event
+        :return: list of lists where each list is a record, and tuple of the SearchElems missing from the coupon line
+        """
+
+        markets_column = coupon_line.find("div", class_="avb-col-markets")
+        market_columns = markets_column.find_all("div", class_="details-market") if markets_column is not None else []
+
         list_of_bet_info = []
-        for elem in single_event_soup.select(f'div[class*="{bet_type["bet_type"]}-"]'):
-            logger.info(f"Parsing the element")
-            logger.info(f"\tevent_id = {event_id}")
-            logger.info(f"\tbet_type = {bet_type}")
-
-            # Contains total runs over/under and the spread
-            ui_runner_handicap = [i.text for i in elem.find_all("span", class_="ui-runner-handicap")]
-            logger.info(f"\tui_runner_handicap = {ui_runner_handicap}")
-
-            # Contains total score over/under, spread and moneyline prices
-            ui_runner_price = [i.text.strip("\n") for i in elem.find_all("span", class_="ui-runner-price")]
-            logger.info(f"\tui_runner_price = {ui_runner_price}")
-
-            # Contains teams
-            teams = [i.text for i in elem.find_all("span", class_="runner-name")]
-            logger.info(f"\tteams = {teams}")
-
-            for i in range(2):
-                # 0 is away team and 1 is home team
-                single_line = [
+        missing_search_elems = []
+        for search_elem in search_elems:
+            if search_elem.coupon_column is None or search_elem.coupon_column >= len(market_columns):
+                missing_search_elems.append(search_elem)
+                continue
+
+            market_column = market_columns[search_elem.coupon_column]
+            ui_runner_price = [i.text.strip() for i in market_column.find_all("span", class_="ui-runner-price")]
+            ui_runner_handicap = [i.text.strip() for i in market_column.find_all("span", class_="ui-runner-handicap")]
+            runner_names = [i.text.strip() for i in market_column.find_all("span", class_="runner-name")]
+
+            try:
+                if len(ui_runner_price) < 2 or (search_elem.has_handicap is True and len(ui_runner_handicap) < 2):
+                    raise ValueError(f"{len(ui_runner_price)} prices and {len(ui_runner_handicap)} handicaps")
+                for price in ui_runner_price[:2]:
+                    float(price)
+                runner_order, handicaps = self.coupon_runner_order(
+                    search_elem, runner_names, ui_runner_handicap, away_team, home_team
+                )
+            except ValueError as e:
+                logger.debug("No %s prices on the coupon for event_id = %s : %s", search_elem.bet_type, event_id, e)
+                missing_search_elems.append(search_elem)
+                continue
+
+            for i, team, over_under in zip(runner_order, [away_team, home_team], ["over", "under"]):
+                team = team if search_elem.has_teams is True else None
+                list_of_bet_info.append([
                     self.website,
                     event_id,
-                    bet_type["bet_type_normalized"], # bet_type
-                    teams[i] if bet_type["has_teams"] is True else None, # team
+                    search_elem.bet_type_normalized, # bet_type
+                    team, # team
                     None,  # american line
                     ui_runner_price[i],  # decimal line
                     None,  # fractional line
-                    ui_runner_handicap[i] if bet_type["has_handicap"] is True else None,  # handicap_spread
-                    teams[i].lower() if bet_type["has_teams"] is False else None # over_under
-                ]
-                logger.info(f"\tsingle_line = {single_line}")
-                list_of_bet_info.append(single_line)
+                    handicaps[i] if search_elem.has_handicap is True else None,  # handicap_spread
+                    over_under if search_elem.has_teams is False else None, # over_under
+                    self.team_index.team_key(team) # team_key
+                ])
+
+        return list_of_bet_info, tuple(missing_search_elems)
+
+
+    def coupon_runner_order(
+            self,
+            search_elem: SearchElem,
+            runner_names: list,
+            ui_runner_handicap: list,
+            away_team: str,
+            home_team: str
+    ):
+        """
+        Find which of the two runners of a coupon market is the away team / over
+
+        Team markets are ordered by the runner names when the coupon shows them. Totals are ordered by their
+        Over / Under runner names, or else by an O / U label in front of the total, whose two totals must then
+        be the same. Without any label the coupon order, away team / over first, is kept
+
+        :param search_elem: SearchElem of the market
+        :param runner_names: text of the runner-name spans of the market, possibly empty
+        :param ui_runner_handicap: text of the ui-runner-handicap spans of the market, possibly empty
+        :param away_team: away team of the event
+        :param home_team: home team of the event
+        :return: indexes of the away team / over runner and of the home team / under runner, and the handicap
+            of each runner without its O / U label
+        """
 
-            # logger.info(list_of_bet_info)
-            return list_of_bet_info
+        handicaps = list(ui_runner_handicap)
+
+        if search_elem.has_teams is True:
+            if len(runner_names) < 2:
+                return [0, 1], handicaps
+            labels = [self.team_index.team_key(runner_name) for runner_name in runner_names[:2]]
+            expected_labels = [self.team_index.team_key(away_team), self.team_index.team_key(home_team)]
+        else:
+            if len(runner_names) >= 2:
+                labels = [runner_name[:1].lower() for runner_name in runner_names[:2]]
+            else:
+                labels = []
+                for i, runner_handicap in enumerate(handicaps[:2]):
+                    total_match = COUPON_TOTAL_PATTERN.match(runner_handicap)
+                    if total_match is None:
+                        raise ValueError(f"total {runner_handicap!r} is not a number")
+                    labels.append((total_match.group(1) or "")[:1].lower())
+                    handicaps[i] = total_match.group(2)
+                if not any(labels):
+                    return [0, 1], handicaps
+                if len(handicaps) < 2 or handicaps[0] != handicaps[1]:
+                    raise ValueError(f"over and under totals differ : {handicaps}")
+            expected_labels = ["o", "u"]
+
+        if labels == expected_labels:
+            return [0, 1], handicaps
+        if labels == expected_labels[::-1]:
+            return [1, 0], handicaps
+
+        raise ValueError(f"runners {runner_names or ui_runner_handicap} do not match {expected_labels}")
+
+
+    def fetch_event_pages(
+            self,
+            event_pages: list
+    ):
+        """
+        Download the event pages that are due for a refresh, highest priority first, within the request budget
+
+        The last page of every other event is linked into the snapshot directory from the http cache, so that
+        the snapshot stays complete. Without a refresh config every page is downloaded
+
+        :param event_pages: list of [event_id, url, file_path, minutes_to_start] of the events on the coupon
+        :return: list in the same order as event_pages with the snapshot dict of a downloaded page,
+            None for a reused page or the exception of a page that is not available
+        """
+
+        if self.refresh_scheduler is not None:
+            self.refresh_scheduler.retain([event_id for event_id, *_ in event_pages])
+            refresh, reuse = self.refresh_scheduler.select(
+                [(event_id, event_minutes_to_start) for event_id, _, _, event_minutes_to_start in event_pages]
+            )
+        else:
+            refresh, reuse = [event_id for event_id, *_ in event_pages], {}
+
+        event_pages_by_event_id = {event_page[0]: event_page for event_page in event_pages}
+
+        # Download all the due event pages concurrently within the rate limit
+        logger.info(f"Fetching {len(refresh)} of {len(event_pages)} event pages, reusing {len(reuse)}")
+        with self.metrics.span("fetch_event_pages") as span:
+            refresh_results = self.fetch_scheduler.fetch_all(
+                [(event_pages_by_event_id[event_id][1], event_pages_by_event_id[event_id][2]) for event_id in refresh]
+            )
+            fetched = [fetch_result for fetch_result in refresh_results if not isinstance(fetch_result, Exception)]
+            span["bytes_fetched"] = sum(fetch_result["bytes"] for fetch_result in fetched)
+            span["rate_limit_wait_seconds"] = sum(fetch_result["wait_seconds"] for fetch_result in fetched)
+            span["records"] = len(fetched)
+            span["reused_pages"] = len(reuse)
+
+        fetch_results_by_event_id = dict(zip(refresh, refresh_results))
+
+        http_cache = get_http_cache()
+        for event_id, digest in reuse.items():
+            try:
+                http_cache.link_snapshot(digest, event_pages_by_event_id[event_id][2])
+                fetch_results_by_event_id[event_id] = None
+            except OSError as e:
+                fetch_results_by_event_id[event_id] = e
+
+        return [
+            fetch_results_by_event_id.get(event_id, LookupError("left out by the request budget"))
+            for event_id, *_ in event_pages
+        ]
 
 
     def extract_bet_data_from_html(
             self,
             elements,
             extracted_data_files_directory: str,
-            website_base_url: str
+            website_base_url: str,
+            replay: bool=False
     ):
         """
 
         :param elements: HTML li elements from betfair website to be parsed
         :param extracted_data_files_directory: directory where extracted data files are stored
         param website_base_url: base url for the website
+        :param replay: True to read the event pages already saved in extracted_data_files_directory
+            instead of downloading them, without any request or rate limit wait
         :return: two lists - one with metadata about the games and one for all the bet info
+
+        With coupon_prices set for the website, the prices rendered on the coupon are used and only the events
+        with markets missing from the coupon need their event page, which is then only searched for those markets
         """
 
-        search_elems = read_json_file(f"{Path(__file__).parents[1]}/constants/betfair_search_elems.json")["search_elems"]
+        self.apply_config()
+        # The instance is kept between runs, only the events of this run are reported
+        self.missing_markets = {}
+        search_elems = get_config("betfair_search_elems.json")
         logger.info(f"search_elems = {search_elems}")
 
+        # Today / Tomorrow on the coupon are relative to when the snapshot was taken
+        if self.uid_timestamp is not None:
+            snapshot_time = datetime.strptime(str(self.uid_timestamp), '%Y%m%d%H%M%S')
+        else:
+            snapshot_time = datetime.now()
+        snapshot_date = snapshot_time.date()
+
         event_list = []
         data_records = []
+        event_pages = []
+        # event_id to the SearchElems to read from its event page
+        event_pages_search_elems = {}
+        coupon_priced_events = 0
         for elem in elements:
             # Find the event date
             # If event date element does not exist then that means the event is "IN PLAY" so we want to skip
             event_date_element = elem.find("span", class_="date ui-countdown")
             if event_date_element is not None:
                 if "Tomorrow" in event_date_element.text:
-                    event_date = str(datetime.today().date() + timedelta(days=1))
+                    event_date = str(snapshot_date + timedelta(days=1))
                 else:
-                    event_date = str(datetime.today().date())
+                    event_date = str(snapshot_date)
 
                 event_info = elem.find("div", class_="avb-col avb-col-runners")
                 event_id_href = event_info.find_all("a", href=True)
@@ -125,40 +565,105 @@ class Betfair(SportsBetting):
 
                         logger.info(f"event_info = {event_id, event_date, data_competition, away_team, home_team}")
 
+                        away_team_key = self.team_index.team_key(away_team)
+                        home_team_key = self.team_index.team_key(home_team)
                         event_list.append([
                             event_id,
                             event_date,
                             data_competition,
                             away_team,
-                            home_team
+                            home_team,
+                            self.team_index.event_key(event_date, away_team_key, home_team_key),
+                            away_team_key,
+                            home_team_key
                         ])
+                        if self.coupon_prices is True:
+                            coupon_records, event_search_elems = self.coupon_market_finder(
+                                elem, search_elems, event_id, away_team, home_team
+                            )
+                            data_records.extend(coupon_records)
+                            if len(event_search_elems) == 0:
+                                coupon_priced_events += 1
+                                continue
+                        else:
+                            event_search_elems = search_elems
+
                         file_name = f"{event_date.replace('-', '')}-{event_id}-{away_team}-{home_team}"
 
-                        sleep_seconds = random.randrange(10, 20)
-                        logger.info(f"Sleeping for {sleep_seconds} seconds...")
-                        time.sleep(sleep_seconds)
-                        extract_from_url(
-                            url=f"{website_base_url}{event_href}",
-                            file_path=os.path.join(extracted_data_files_directory, file_name)
-                        )
-
-                        single_event_soup = read_html_data(
-                            file_path=os.path.join(extracted_data_files_directory, file_name)
-                        )
-
-                        for search_elem in search_elems:
-                            logger.info(f"search_elem = {search_elem}")
-                            try:
-                                data_records.extend(
-                                    self.bet_type_finder(
-                                        single_event_soup,
-                                        search_elem,
-                                        event_id
-                                    ))
-                            except Exception as e:
-                                logger.info(f"Exception : {e}")
-                                logger.info(f"Bad {search_elem} record")
-                                continue
+                        event_pages.append([
+                            event_id,
+                            f"{website_base_url}{event_href}",
+                            os.path.join(extracted_data_files_directory, file_name),
+                            minutes_to_start(event_date_element.text, snapshot_time)
+                        ])
+                        event_pages_search_elems[event_id] = event_search_elems
+
+        if self.coupon_prices is True:
+            logger.info(f"{coupon_priced_events} events fully priced from the coupon, {len(event_pages)} event pages needed")
+
+        if replay is True:
+            # Only the event pages saved with the snapshot are parsed, nothing is downloaded
+            logger.info(f"Replaying {len(event_pages)} event pages from {extracted_data_files_directory}")
+            fetch_results = [
+                None if os.path.exists(file_path) else FileNotFoundError(file_path)
+                for _, url, file_path, _ in event_pages
+            ]
+        else:
+            fetch_results = self.fetch_event_pages(event_pages)
+
+        parse_jobs = []
+        for (event_id, url, file_path, _), fetch_result in zip(event_pages, fetch_results):
+            if isinstance(fetch_result, Exception):
+                logger.info(f"Skipping event_id = {event_id} since {url} could not be {'found' if replay is True else 'fetched'} : {fetch_result!r}")
+                continue
+            parse_jobs.append((event_id, file_path, event_pages_search_elems[event_id]))
+        fetch_results_by_event_id = {event_id: fetch_result for (event_id, *_), fetch_result in zip(event_pages, fetch_results)}
+
+        with self.metrics.span("parse_event_pages") as span:
+            if self.parse_processes > 1 and len(parse_jobs) >= MIN_EVENT_PAGES_FOR_PROCESS_POOL:
+                if self.parse_executor is None:
+                    # Forking now would copy locks held by the job, fetch and logging threads into the workers,
+                    # which then deadlock in init_parse_worker. init_parse_worker rebuilds every worker state anyway
+                    self.parse_executor = ProcessPoolExecutor(
+                        max_workers=self.parse_processes,
+                        mp_context=get_parse_worker_context(),
+                        initializer=init_parse_worker,
+                        initargs=(self.sport,)
+                    )
+                logger.info(f"Parsing {len(parse_jobs)} event pages on {self.parse_processes} processes")
+
+                # map returns the results in event order
+                parse_results = self.parse_executor.map(
+                    parse_event_page_in_worker,
+                    [event_id for event_id, _, _ in parse_jobs],
+                    [file_path for _, file_path, _ in parse_jobs],
+                    [event_search_elems for _, _, event_search_elems in parse_jobs],
+                    chunksize=max(1, len(parse_jobs) // (self.parse_processes * 4))
+                )
+            else:
+                parse_results = (
+                    self.parse_event_page(event_id, file_path, event_search_elems)
+                    for event_id, file_path, event_search_elems in parse_jobs
+                )
+
+            for (event_id, file_path, _), (records, missing_bet_types) in zip(parse_jobs, parse_results):
+                data_records.extend(records)
+
+                # Only a page downloaded on this run says whether the prices of the event moved
+                fetch_result = fetch_results_by_event_id[event_id]
+                if self.refresh_scheduler is not None and fetch_result is not None:
+                    self.refresh_scheduler.record_fetch(
+                        event_id,
+                        fetch_result["digest"],
+                        # bet_type, team, handicap_spread and over_under of a record to its decimal line
+                        {(record[2], record[3], record[7], record[8]): record[5] for record in records}
+                    )
+
+                if len(missing_bet_types) > 0:
+                    logger.info(f"Markets missing for event_id = {event_id} : {missing_bet_types}")
+                    self.missing_markets[event_id] = missing_bet_types
+
+            span["records"] = len(data_records)
 
         return event_list, data_records
 
@@ -167,7 +672,8 @@ class Betfair(SportsBetting):
             self,
             all_games_soup,
             extracted_data_files_directory: str,
-            website_base_url: str
+            website_base_url: str,
+            replay: bool=False
     ):
         """
         Create a dataframe with betting info
@@ -175,23 +681,39 @@ class Betfair(SportsBetting):
         :param all_games_soup: Beautiful soup of games to be parsed / included in dataframe
         :param extracted_data_files_directory: directory where extracted data files are stored
         :param website_base_url: base url for the website
+        :param replay: True to parse the event pages already saved in extracted_data_files_directory without downloading them
         :return: dataframe with betting info
         """
 
+        # pandas is only imported once a dataframe is built, so importing the module stays cheap
+        import pandas as pd
+        from utility.record_builder import ColumnarRecordBuilder
+
         elements = all_games_soup.find_all("li", class_="com-coupon-line-new-layout")
-        event_list, data_records = self.extract_bet_data_from_html(elements, extracted_data_files_directory, website_base_url)
+        event_list, data_records = self.extract_bet_data_from_html(elements, extracted_data_files_directory, website_base_url, replay)
+        # Teams that matched no alias are written to the team index once per parse
+        self.team_index.save_changes()
 
         # Retrieve the dataframe headers
-        df_headers = read_json_file(f"{Path(__file__).parents[1]}/constants/dataframe_headers.json")
-        df_event_headers = df_headers["df_event_headers"]
+        df_headers = get_config("dataframe_headers.json")
+        df_event_headers = list(df_headers.df_event_headers + df_headers.df_event_key_headers)
         logger.info(f"df_event_headers = {df_event_headers}")
-        df_records_headers = df_headers["df_records_headers"]
+        df_records_headers = list(df_headers.df_records_headers + df_headers.df_records_key_headers)
         logger.info(f"df_records_headers = {df_records_headers}")
 
-        df_events = pd.DataFrame(data=event_list, columns=df_event_headers)
-        df_records = pd.DataFrame(data=data_records, columns=df_records_headers)
+        with self.metrics.span("build_dataframe") as span:
+            events_builder = ColumnarRecordBuilder(df_event_headers, df_headers.df_column_dtypes)
+            events_builder.extend(event_list)
+            records_builder = ColumnarRecordBuilder(df_records_headers, df_headers.df_column_dtypes)
+            records_builder.extend(data_records)
+
+            df_events = events_builder.to_dataframe()
+            df_records = records_builder.to_dataframe()
+            span["records"] = len(df_records)
 
-        df_betfair = pd.merge(df_events, df_records, how="inner", on="event_id")
+        with self.metrics.span("merge") as span:
+            df_betfair = pd.merge(df_events, df_records, how="inner", on="event_id")
+            span["records"] = len(df_betfair)
 
         return df_betfair
 
@@ -203,7 +725,9 @@ class Betfair(SportsBetting):
         """
         Create pandas dataframe of betting info
 
-        :param uid_timestamp: YYYYMMDDHHMMSS timestamp folder that files are saved to
+        :param uid_timestamp: YYYYMMDDHHMMSS timestamp folder that files are saved to.
+            When provided, the snapshot in the folder is replayed: all_games.txt and the event pages
+            saved with it are parsed without any request
         :return: pandas dataframe of betting info
         """
 
@@ -215,13 +739,16 @@ class Betfair(SportsBetting):
             uid_timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         
         logger.info(f"uid_timestamp = {uid_timestamp}")
+        self.uid_timestamp = uid_timestamp
 
         extracted_data_files_directory = self.get_data_directory(self.website, self.sport, uid_timestamp)
 
         logger.info(f"extracted_data_files_directory = {extracted_data_files_directory}")
 
-        sports_betting_info = read_json_file(f"{Path(__file__).parents[1]}/constants/betting_sites_info.json")[self.website]
-        website_base_url = sports_betting_info["website_base_url"]
+        self.metrics = RunMetrics(f"{self.website}/{self.sport}")
+
+        self.apply_config()
+        website_base_url = self.website_config.website_base_url
         logger.info(f"website_base_url = {website_base_url}")
 
         all_games_file_name = "all_games.txt"
@@ -232,27 +759,41 @@ class Betfair(SportsBetting):
             #   of provided timestamp, and not calling the url
 
             logger.info(f"uid_timestamp_none is True so calling url")
-            extract_from_url(
-                url=f"{website_base_url}/sport/{self.sport}/nba/10547864",
-                file_path=os.path.join(extracted_data_files_directory, all_games_file_name)
-            )
+            with self.metrics.span("fetch") as span:
+                self.all_games_snapshot = extract_from_url(
+                    url=f"{website_base_url}/sport/{self.sport}/nba/10547864",
+                    file_path=os.path.join(extracted_data_files_directory, all_games_file_name)
+                )
+                span["bytes_fetched"] = self.all_games_snapshot["bytes"]
         else:
             logger.info("uid_timestamp_none is False so NOT calling url")
 
-        all_games_soup = read_html_data(
-            file_path=os.path.join(extracted_data_files_directory, all_games_file_name)
-        )
+        with self.metrics.span("parse_coupon"):
+            all_games_soup = read_html_data(
+                file_path=os.path.join(extracted_data_files_directory, all_games_file_name),
+                parse_only=get_strainer("coupon_line"),
+                html_parser=self.html_parser
+            )
 
         df_bet_info = self.create_df_betfair(
             all_games_soup=all_games_soup,
             extracted_data_files_directory=extracted_data_files_directory,
-            website_base_url=website_base_url
+            website_base_url=website_base_url,
+            replay=not uid_timestamp_none
         )
+        if uid_timestamp_none is True:
+            # Saved once the event pages were fetched too
+            get_http_cache().save_index()
+
+        self.metrics.write(extracted_data_files_directory)
 
         return df_bet_info
     
 
 if __name__ == "__main__":
+    from utility.http_client import get_http_client
+    from utility.line_store import get_line_store
+
     parser = argparse.ArgumentParser()
     parser.add_argument("--uid-timestamp", dest="uid_timestamp", required=False, type=int,
                         help="YYYYMMDDHHMMSS timestamp folder that files are saved to")
@@ -264,4 +805,6 @@ if __name__ == "__main__":
     bovada_basketball = Betfair("basketball")
 
     df_bet_info = bovada_basketball.create_df_with_lines(uid_timestamp)
-    df_bet_info.to_csv(os.path.join(bovada_basketball.output_directory, "betfair.csv"), index=False)
\ No newline at end of file
+    get_line_store().write(df_bet_info, bovada_basketball.website, bovada_basketball.sport, bovada_basketball.uid_timestamp)
+
+    get_http_client().log_latency_summary()
\ No newline at end of file
@@ -5,12 +5,12 @@ import pandas as pd
 import os
 import random
 from pathlib import Path
-from utility.helper_functions import extract_from_url, read_html_data, read_json_file, get_data_directory
+from utility.helper_functions import extract_from_url, read_html_data, read_json_file, get_data_directory, get_http_cache
 from utility.logging_utils import create_logger
 import argparse
 
 
-logger = create_logger()
+logger = create_logger(name=__name__)
 
 WEBSITE = "betfair"
 SPORT = "basketball"
@@ -213,6 +213,7 @@ def create_df_with_lines(extracted_data_files_directory: str):
         extracted_data_files_directory=extracted_data_files_directory,
         website_base_url=website_base_url
     )
+    get_http_cache().save_index()
 
     return df_bet_info
 
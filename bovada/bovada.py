@@ -1,17 +1,15 @@
-import requests
-from datetime import datetime, timedelta
-import time
-import pandas as pd
+from datetime import datetime
 import os
-import random
-from pathlib import Path
-from utility.helper_functions import extract_from_url, read_json_file
+from utility.helper_functions import extract_from_url, read_json_file, iter_json_array, get_http_cache
 from utility.logging_utils import create_logger
 import argparse
 from utility.sports_betting import SportsBetting
+from utility.metrics import RunMetrics
+from utility.team_index import get_team_index
+from utility.config import get_config
 
 
-logger = create_logger()
+logger = create_logger(name=__name__)
 
 
 class Bovada(SportsBetting):
@@ -22,34 +20,60 @@ class Bovada(SportsBetting):
         super().__init__(sport)
         self.website = "bovada"
 
+        # Markets to keep, keyed on (display group, descriptionKey, description) and mapped to the normalized bet type.
+        # Built by apply_config from bovada_market_types.json
+        self.market_types_config = None
+        self.market_types = {}
+        self.apply_config()
 
-    def extract_bet_data_from_json(
+        # Canonical integer keys of teams and events, shared by every website
+        self.team_index = get_team_index()
+
+
+    def apply_config(self):
+        """
+        Build the market types from bovada_market_types.json, again whenever the file was reloaded
+
+        The instance is kept for every later run of the process, so it checks the config at the start of each run
+        rather than copying it once
+
+        :return: None
+        """
+
+        market_types_config = get_config("bovada_market_types.json")
+        if market_types_config is self.market_types_config:
+            return
+
+        self.market_types = {
+            (market_type.display_group, market_type.description_key, market_type.description): market_type.bet_type_normalized
+            for market_type in market_types_config
+        }
+        self.market_types_config = market_types_config
+
+
+    def iter_bet_data_from_json(
             self,
-            bets_json_data: dict,
-            extracted_data_files_directory: str
+            bets_json_data
     ):
         """
-        Parse the json with betting lines
+        Walk the competitions in the json with betting lines and yield records as they are found
 
-        :param bets_json_data: json from bovada API to be parsed
-        :param extracted_data_files_directory: directory where extracted data files are stored
-        :return: two lists - one with metadata about the games and one for all the bet info
+        :param bets_json_data: iterable of competitions from bovada API, either the parsed list or a stream
+        :return: generator of ("event", event_record) and ("line", single_line) tuples
         """
 
-        data_records = []
-        event_list = []
+        self.apply_config()
 
-        logger.info(f"Length of bets list = {len(bets_json_data)}")
-        for i in range(len(bets_json_data)):
-            logger.info(f'i = {i}, {bets_json_data[i]["path"][0]["link"]}')
-            if bets_json_data[i]["path"][0]["link"] == f"/{self.sport}/nba":
-                competition = bets_json_data[i]["path"][0]["link"].split("/")[-1]
-                logger.info(f'Number of events = {len(bets_json_data[i]["events"])}')
-                for event in bets_json_data[i]["events"]:
+        for i, bets_json_competition in enumerate(bets_json_data):
+            logger.debug("i = %s, %s", i, bets_json_competition["path"][0]["link"])
+            if bets_json_competition["path"][0]["link"] == f"/{self.sport}/nba":
+                competition = bets_json_competition["path"][0]["link"].split("/")[-1]
+                logger.info(f'Number of events = {len(bets_json_competition["events"])}')
+                for event in bets_json_competition["events"]:
                     event_id = event["id"]
                     event_date = datetime.fromtimestamp(event["startTime"]/1000).strftime('%Y-%m-%d')
                     is_live = event["displayGroups"][0]["markets"][0]["period"]["live"]
-                    logger.info(f"is_live = {is_live} : {event_id, event_date, competition}")
+                    logger.debug("is_live = %s : %s, %s, %s", is_live, event_id, event_date, competition)
                     if is_live == False:
 
                         for teams in event["competitors"]:
@@ -58,111 +82,136 @@ class Bovada(SportsBetting):
                             else:
                                 away_team = teams["name"]
 
-                        event_record = [event_id, event_date, competition, away_team, home_team]
-                        logger.info(f"event_record : {event_record}")
-                        event_list.append(event_record)
+                        away_team_key = self.team_index.team_key(away_team)
+                        home_team_key = self.team_index.team_key(home_team)
+                        event_record = [
+                            event_id, event_date, competition, away_team, home_team,
+                            self.team_index.event_key(event_date, away_team_key, home_team_key), away_team_key, home_team_key
+                        ]
+                        logger.debug("event_record : %s", event_record)
+                        yield "event", event_record
 
                         for dg in event["displayGroups"]:
-                            if dg["description"] in ("Game Lines", "Alternate Lines"):
-                                for market in dg["markets"]:
-
-                                    if market["period"]["description"] == "Game" and is_live is False:
-                                        insert_record = False
-
-                                        if dg["description"] == "Game Lines":
-                                            logger.info("Game Lines exist")
-                                            if market["period"]["description"] == "Game" and \
-                                                ((market["descriptionKey"] == "Head To Head" and market["description"] == "Moneyline") \
-                                                or (market["descriptionKey"] == "Main Dynamic Over/Under" and market["description"] == "Total") \
-                                                or (market["descriptionKey"] == "Main Dynamic Asian Runline" and market["description"] == "Runline")):
-
-                                                insert_record = True
-                                                if market["description"] == "Moneyline":  # Game lines Moneyline
-                                                    bet_type = "moneyline"
-                                                elif market["description"] == "Total":  # Game lines O/U
-                                                    bet_type = "over_under"
-                                                elif market["description"] == "Runline":  # Game lines handicap
-                                                    bet_type = "handicap"
-
-                                        elif dg["description"] == "Alternate Lines":
-                                            logger.info("Alternate Lines exist")
-                                            if (market["descriptionKey"] == "Total Runs O/U" and market["description"] == "Total Runs O/U") \
-                                                    or (market["descriptionKey"] == "Handicap - Asian" and market["description"] == "Spread"):
-                                                # print("alternate lines")
-                                                # print(market)
-                                                insert_record = True
-                                                if market["description"] == "Spread":  # Alternate handicap
-                                                    bet_type = "handicap"
-                                                elif market["description"] == "Total Runs O/U":  # Alternate O/U
-                                                    bet_type = "over_under"
-
-                                        logger.info(f"insert_record = {insert_record}")
-                                        if insert_record is True:
-                                            for line in market["outcomes"]:
-                                                # Status can be O or S (based on what I've seen). No documentation but I believe O means open
-                                                # Some lines will have O and S which causes dupes and the O corresponds with what I see on front-end
-                                                # For example, O/U of 11.5 may have 4 records, 2 with status O and 2 with status S
-                                                # We only want one of these and O appears to be the right one
-                                                if line["status"] == "O":
-
-                                                    single_line = [
-                                                        self.website,
-                                                        event_id,
-                                                        bet_type, # bet type
-                                                        None if bet_type == "over_under" else line["description"],  # team
-                                                        line["price"]["american"],  # american line
-                                                        line["price"]["decimal"], # decimal line
-                                                        line["price"]["fractional"], # fractional line
-                                                        line["price"].get("handicap",None),  # handicap_spread
-                                                        line["description"].lower() if bet_type == "over_under" else None  # over_under
-                                                    ]
-
-                                                    logger.info(f"single_line = {single_line}")
-                                                    data_records.append(single_line)
-
-                            insert_record = False
+                            for market in dg["markets"]:
+                                if market["period"]["description"] != "Game":
+                                    continue
+
+                                # Single lookup of the (display group, descriptionKey, description) of the market
+                                bet_type = self.market_types.get((dg["description"], market["descriptionKey"], market["description"]))
+                                if bet_type is None:
+                                    continue
+
+                                logger.debug("bet_type = %s : %s, %s", bet_type, dg["description"], market["description"])
+                                for line in market["outcomes"]:
+                                    # Status can be O or S (based on what I've seen). No documentation but I believe O means open
+                                    # Some lines will have O and S which causes dupes and the O corresponds with what I see on front-end
+                                    # For example, O/U of 11.5 may have 4 records, 2 with status O and 2 with status S
+                                    # We only want one of these and O appears to be the right one
+                                    if line["status"] == "O":
+
+                                        team = None if bet_type == "over_under" else line["description"]
+                                        single_line = [
+                                            self.website,
+                                            event_id,
+                                            bet_type, # bet type
+                                            team,  # team
+                                            line["price"]["american"],  # american line
+                                            line["price"]["decimal"], # decimal line
+                                            line["price"]["fractional"], # fractional line
+                                            line["price"].get("handicap",None),  # handicap_spread
+                                            line["description"].lower() if bet_type == "over_under" else None,  # over_under
+                                            self.team_index.team_key(team)  # team_key
+                                        ]
+
+                                        logger.debug("single_line = %s", single_line)
+                                        yield "line", single_line
+
+
+    def extract_bet_data_from_json(
+            self,
+            bets_json_data,
+            extracted_data_files_directory: str
+    ):
+        """
+        Parse the json with betting lines
+
+        :param bets_json_data: json from bovada API to be parsed, either the parsed list or a stream of competitions
+        :param extracted_data_files_directory: directory where extracted data files are stored
+        :return: two lists - one with metadata about the games and one for all the bet info
+        """
+
+        data_records = []
+        event_list = []
+
+        for record_type, record in self.iter_bet_data_from_json(bets_json_data):
+            if record_type == "event":
+                event_list.append(record)
+            else:
+                data_records.append(record)
 
         return event_list, data_records
 
 
     def create_df_bovada(
             self,
-            bets_json_data: dict,
+            bets_json_data,
             extracted_data_files_directory: str
     ):
         """
         Create a dataframe with betting lines
 
-        :param bets_json_data: json from bovada API to be parsed
+        :param bets_json_data: json from bovada API to be parsed, either the parsed list or a stream of competitions
         :param extracted_data_files_directory: directory where extracted data files are stored
         :return: dataframe with betting info
         """
 
-        event_list, data_records = self.extract_bet_data_from_json(bets_json_data, extracted_data_files_directory)
+        # pandas is only imported once a dataframe is built, so importing the module stays cheap
+        import pandas as pd
+        from utility.record_builder import ColumnarRecordBuilder
 
         # Retrieve the dataframe headers
-        df_headers = read_json_file(f"{Path(__file__).parents[1]}/constants/dataframe_headers.json")
-        df_event_headers = df_headers["df_event_headers"]
+        df_headers = get_config("dataframe_headers.json")
+        df_event_headers = list(df_headers.df_event_headers + df_headers.df_event_key_headers)
         logger.info(f"df_event_headers = {df_event_headers}")
-        df_records_headers = df_headers["df_records_headers"]
+        df_records_headers = list(df_headers.df_records_headers + df_headers.df_records_key_headers)
         logger.info(f"df_records_headers = {df_records_headers}")
 
-        df_events = pd.DataFrame(data=event_list, columns=df_event_headers)
-        df_records = pd.DataFrame(data=data_records, columns=df_records_headers)
-
-        df_bovada = pd.merge(df_events, df_records, how="inner", on="event_id")
+        # Records go straight from the parser into typed column buffers
+        events_builder = ColumnarRecordBuilder(df_event_headers, df_headers.df_column_dtypes)
+        records_builder = ColumnarRecordBuilder(df_records_headers, df_headers.df_column_dtypes)
+        with self.metrics.span("parse_json") as span:
+            for record_type, record in self.iter_bet_data_from_json(bets_json_data):
+                if record_type == "event":
+                    events_builder.append(record)
+                else:
+                    records_builder.append(record)
+            span["records"] = len(records_builder)
+        # Teams that matched no alias are written to the team index once per parse
+        self.team_index.save_changes()
+
+        with self.metrics.span("build_dataframe") as span:
+            df_events = events_builder.to_dataframe()
+            df_records = records_builder.to_dataframe()
+            span["records"] = len(df_records)
+
+        with self.metrics.span("merge") as span:
+            df_bovada = pd.merge(df_events, df_records, how="inner", on="event_id")
+            span["records"] = len(df_bovada)
 
         return df_bovada
 
 
     def create_df_with_lines(
             self, 
-            uid_timestamp: int=None
+            uid_timestamp: int=None,
+            streaming: bool=False
         ):
         """
         Create pandas dataframe of betting info
 
         :param uid_timestamp: YYYYMMDDHHMMSS timestamp folder that files are saved to
+        :param streaming: True to decode all_games.txt one competition at a time, skipping other
+            leagues without decoding them, instead of loading the whole json into memory
         :return: pandas dataframe of betting info
         """
 
@@ -174,13 +223,15 @@ class Bovada(SportsBetting):
             uid_timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         
         logger.info(f"uid_timestamp = {uid_timestamp}")
+        self.uid_timestamp = uid_timestamp
 
         extracted_data_files_directory = self.get_data_directory(self.website, self.sport, uid_timestamp)
 
         logger.info(f"extracted_data_files_directory = {extracted_data_files_directory}")
 
-        sports_betting_info = read_json_file(f"{Path(__file__).parents[1]}/constants/betting_sites_info.json")[self.website]
-        website_base_url = sports_betting_info["website_base_url"]
+        self.metrics = RunMetrics(f"{self.website}/{self.sport}")
+
+        website_base_url = get_config("betting_sites_info.json")[self.website].website_base_url
         logger.info(f"website_base_url = {website_base_url}")
 
         all_games_file_name = "all_games.txt"
@@ -191,29 +242,47 @@ class Bovada(SportsBetting):
             #   of provided timestamp, and not calling the url
 
             logger.info(f"uid_timestamp_none is True so calling url")
-            extract_from_url(
-                url=f"{website_base_url}/{self.sport}",
-                file_path=os.path.join(extracted_data_files_directory, all_games_file_name)
-            )
+            with self.metrics.span("fetch") as span:
+                self.all_games_snapshot = extract_from_url(
+                    url=f"{website_base_url}/{self.sport}",
+                    file_path=os.path.join(extracted_data_files_directory, all_games_file_name)
+                )
+                span["bytes_fetched"] = self.all_games_snapshot["bytes"]
+            get_http_cache().save_index()
         else:
             logger.info("uid_timestamp_none is False so NOT calling url")
 
-        bets_json_data = read_json_file(
-            file_path=os.path.join(extracted_data_files_directory, all_games_file_name)
-        )
+        if streaming is True:
+            # Only competitions whose text contains the league link (plain or with escaped slashes) are decoded
+            bets_json_data = iter_json_array(
+                file_path=os.path.join(extracted_data_files_directory, all_games_file_name),
+                must_contain=(f"/{self.sport}/nba", f"\\/{self.sport}\\/nba")
+            )
+        else:
+            with self.metrics.span("read_json"):
+                bets_json_data = read_json_file(
+                    file_path=os.path.join(extracted_data_files_directory, all_games_file_name)
+                )
 
         df_bet_info = self.create_df_bovada(
             bets_json_data=bets_json_data,
             extracted_data_files_directory=extracted_data_files_directory
         )
 
+        self.metrics.write(extracted_data_files_directory)
+
         return df_bet_info
     
 
 if __name__ == "__main__":
+    from utility.http_client import get_http_client
+    from utility.line_store import get_line_store
+
     parser = argparse.ArgumentParser()
     parser.add_argument("--uid-timestamp", dest="uid_timestamp", required=False, type=int,
                         help="YYYYMMDDHHMMSS timestamp folder that files are saved to")
+    parser.add_argument("--streaming", dest="streaming", action="store_true",
+                        help="Decode all_games.txt one competition at a time")
     args = parser.parse_args()
     uid_timestamp = args.uid_timestamp
 
@@ -222,5 +291,7 @@ if __name__ == "__main__":
     bovada_basketball = Bovada("basketball")
     # output_directory = bovada_basketball.get_output_directory()
 
-    df_bet_info = bovada_basketball.create_df_with_lines(uid_timestamp)
-    df_bet_info.to_csv(os.path.join(bovada_basketball.output_directory, "bovada.csv"), index=False)
\ No newline at end of file
+    df_bet_info = bovada_basketball.create_df_with_lines(uid_timestamp, args.streaming)
+    get_line_store().write(df_bet_info, bovada_basketball.website, bovada_basketball.sport, bovada_basketball.uid_timestamp)
+
+    get_http_client().log_latency_summary()
\ No newline at end of file
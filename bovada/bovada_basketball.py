@@ -5,12 +5,12 @@ import pandas as pd
 import os
 import random
 from pathlib import Path
-from utility.helper_functions import extract_from_url, read_json_file, get_data_directory
+from utility.helper_functions import extract_from_url, read_json_file, get_data_directory, get_http_cache
 from utility.logging_utils import create_logger
 import argparse
 
 
-logger = create_logger()
+logger = create_logger(name=__name__)
 
 WEBSITE = "bovada"
 SPORT = "basketball"
@@ -159,6 +159,7 @@ def create_df_with_lines(extracted_data_files_directory: str):
         url=f"{website_base_url}/{SPORT}",
         file_path=os.path.join(extracted_data_files_directory, all_games_file_name)
     )
+    get_http_cache().save_index()
 
     bets_json_data = read_json_file(
         file_path=os.path.join(extracted_data_files_directory, all_games_file_name)
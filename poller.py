@@ -0,0 +1,190 @@
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utility.config import get_config, get_config_registry
+from utility.helper_functions import get_output_directory
+from utility.logging_utils import create_logger
+from utility.poll_schedule import PollSchedule
+
+logger = create_logger(name=__name__)
+
+
+class Poller:
+    def __init__(
+            self,
+            website_filter: str=None,
+            max_concurrency: int=None
+    ):
+        """
+        Continuous polling of every website / sport, each on its own adaptive interval
+
+        Each website / sport is polled again once its interval has passed, never while its previous poll runs,
+        and no more than max_concurrency polls run at the same time across all websites
+
+        :param website_filter: only poll this website, every website when None
+        :param max_concurrency: polls run at the same time (defaults to max_concurrency of poller.json)
+        """
+
+        import sports_betting
+        from arbitrage.quote_book import QuoteBook
+
+        self.sports_betting = sports_betting
+        self.poller_config = poller_config = get_config("poller.json")
+        self.max_concurrency = max_concurrency if max_concurrency is not None else poller_config.max_concurrency
+
+        self.jobs = sports_betting.list_jobs(website_filter)
+        self.schedules = {
+            (website, sport): PollSchedule(poller_config.get_intervals(website))
+            for website, sport in self.jobs
+        }
+        self.quote_book = QuoteBook()
+        self.polls = 0
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        """
+        Stop submitting polls, the polls already running are still gathered
+
+        :return: None
+        """
+
+        self.stop_event.set()
+
+    def reload_config(self):
+        """
+        Pick up edited config files before submitting polls
+
+        The interval settings of poller.json apply from the next poll of each website / sport,
+        a new max_concurrency only applies to a new Poller
+
+        :return: None
+        """
+
+        try:
+            reloaded = get_config_registry().reload_changed()
+            if len(reloaded) > 0:
+                logger.info(f"Reloaded config files {reloaded}")
+        except ValueError as e:
+            logger.info(f"Config not reloaded, keeping the previous one : {e}")
+
+        # The valid files are reloaded even when another one is invalid
+        poller_config = get_config("poller.json")
+        if poller_config is not self.poller_config:
+            for (website, sport), schedule in self.schedules.items():
+                schedule.intervals_config = poller_config.get_intervals(website)
+            self.poller_config = poller_config
+
+    def handle_result(
+            self,
+            website: str,
+            sport: str,
+            result: dict
+    ):
+        """
+        Adapt the interval of a website / sport to the outcome of its poll and refresh arbitrage.csv
+
+        :param website: website that was polled
+        :param sport: sport that was polled
+        :param result: dict returned by sports_betting.collect_job
+        :return: None
+        """
+
+        schedule = self.schedules[(website, sport)]
+
+        if result["status"] == "failure":
+            interval_seconds = schedule.record(error=True)
+        else:
+            # Prices that moved are the best signal, an unchanged all_games download is the fallback
+            if result["changed_quotes"] is not None:
+                lines_changed = result["changed_quotes"] > 0
+            else:
+                lines_changed = result["payload_changed"]
+            interval_seconds = schedule.record(lines_changed, result["seconds"])
+
+        logger.info(
+            f"{website} / {sport} : {result['status']}, changed_quotes = {result['changed_quotes']}, "
+            f"next poll in {interval_seconds:.1f} seconds"
+        )
+
+        if result["changed_opportunities"]:
+            self.quote_book.opportunities_df().to_csv(os.path.join(get_output_directory(), "arbitrage.csv"), index=False)
+            logger.info(f"{result['changed_opportunities']} arbitrage opportunities opened, changed or closed, "
+                        f"{len(self.quote_book.opportunities)} open")
+
+    def run(
+            self,
+            max_polls: int=None
+    ):
+        """
+        Poll until stopped
+
+        :param max_polls: stop after this many polls in total, never stop when None
+        :return: None
+        """
+
+        logger.info(f"Polling {self.jobs} with at most {self.max_concurrency} polls at the same time")
+
+        # Future of the running poll to its (website, sport)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            while True:
+                can_submit = (
+                    not self.stop_event.is_set()
+                    and len(running) < self.max_concurrency
+                    and (max_polls is None or self.polls < max_polls)
+                )
+                if not can_submit and len(running) == 0:
+                    break
+
+                now = time.monotonic()
+                idle_jobs = [job for job in self.jobs if job not in running.values()]
+                due_jobs = sorted(
+                    (job for job in idle_jobs if self.schedules[job].is_due(now)),
+                    key=lambda job: self.schedules[job].next_poll_time
+                )
+
+                if can_submit and len(due_jobs) > 0:
+                    self.reload_config()
+                    for website, sport in due_jobs[:self.max_concurrency - len(running)]:
+                        if max_polls is not None and self.polls >= max_polls:
+                            break
+                        running[executor.submit(self.sports_betting.run_job, website, sport)] = (website, sport)
+                        self.polls += 1
+                    continue
+
+                # Sleep until a poll finishes or the next website / sport is due
+                if can_submit and len(idle_jobs) > 0:
+                    timeout = max(min(self.schedules[job].next_poll_time for job in idle_jobs) - now, 0)
+                else:
+                    timeout = None
+
+                if len(running) == 0:
+                    self.stop_event.wait(timeout)
+                    continue
+
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    website, sport = running.pop(future)
+                    result = self.sports_betting.collect_job(website, sport, future, self.quote_book)
+                    self.handle_result(website, sport, result)
+
+        logger.info(f"Poller stopped after {self.polls} polls")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--website", dest="website_filter", required=False, type=str,
+                        help="Website to poll")
+    parser.add_argument("--max-concurrency", dest="max_concurrency", required=False, type=int,
+                        help="Polls run at the same time across every website (defaults to poller.json)")
+    parser.add_argument("--max-polls", dest="max_polls", required=False, type=int,
+                        help="Stop after this many polls in total (polls forever by default)")
+    args = parser.parse_args()
+
+    poller = Poller(args.website_filter, args.max_concurrency)
+    try:
+        poller.run(args.max_polls)
+    except KeyboardInterrupt:
+        logger.info("Poller interrupted")
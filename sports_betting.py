@@ -1,58 +1,263 @@
 import os
-from pathlib import Path
 import argparse
-import requests
+import importlib
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from datetime import datetime
-from utility.helper_functions import read_json_file
+from utility.helper_functions import get_output_directory, create_directory
+from utility.config import get_config
 from utility.logging_utils import create_logger
-from bovada.bovada_basketball import create_df_with_lines as bovada_create_df_with_lines
-from betfair.betfair_basketball import create_df_with_lines as betfair_create_df_with_lines
+from utility.metrics import RunMetrics
 
-logger = create_logger()
+logger = create_logger(name=__name__)
 
+# Website classes are imported on first use, so that only the websites that are run pay for their imports
+WEBSITE_CLASSES = {
+    "bovada": "bovada.bovada.Bovada",
+    "betfair": "betfair.betfair.Betfair"
+}
 
+# (website, sport) to the instance kept for every later run in this process
+_sports_betting_instances = {}
+_sports_betting_instances_lock = threading.Lock()
 
-def main(
-        website_filter: str=None,
+
+def get_sports_betting(
+        website: str,
+        sport: str
+):
+    """
+    Retrieve the instance for a website / sport, creating it on first use
+
+    Keeping the instance means its config, parsers and pools are only set up once per process
+
+    :param website: website to call API for
+    :param sport: sport to pull lines for
+    :return: SportsBetting instance of the website
+    """
+
+    with _sports_betting_instances_lock:
+        if (website, sport) not in _sports_betting_instances:
+            module_name, class_name = WEBSITE_CLASSES[website].rsplit(".", 1)
+            website_class = getattr(importlib.import_module(module_name), class_name)
+            _sports_betting_instances[(website, sport)] = website_class(sport)
+
+    return _sports_betting_instances[(website, sport)]
+
+
+def list_jobs(website_filter: str=None):
+    """
+    List the website / sport jobs of betting_sites_info.json
+
+    :param website_filter: only the jobs of this website, every website when None
+    :return: list of (website, sport)
+    """
+
+    jobs = []
+    for website, website_config in get_config("betting_sites_info.json").items():
+
+        if website_filter is not None:
+            if website != website_filter:
+                logger.info(f"website = {website} so skipping!!")
+                continue
+
+        logger.info(f"website = {website}")
+        logger.info(f"base_url = {website_config.website_base_url}")
+
+        for sport in website_config.sports:
+            logger.info(f"sport = {sport}")
+            jobs.append((website, sport))
+
+    return jobs
+
+
+def run_job(
+        website: str,
+        sport: str,
         uid_timestamp: str=None
 ):
     """
-    Loop through websites/sports and call API for each website/sport
+    Create the dataframe with lines for a single website / sport and append the lines to the line store
 
     :param website: website to call API for
+    :param sport: sport to pull lines for
+    :param uid_timestamp: specific timestamp from a prior run to load data for
+    :return: dataframe with betting info, the seconds the job took, the job's metrics report (with its request
+        latencies when run in a process pool), its uid_timestamp and the all_games download of the job
+        (None when the job replayed a prior run)
+    """
+
+    from utility.http_client import get_http_client
+    from utility.line_store import get_line_store
+
+    start_time = time.perf_counter()
+
+    sports_betting = get_sports_betting(website, sport)
+    # The instance is kept between jobs, so the download of a previous job must not be reported for this one
+    sports_betting.all_games_snapshot = None
+    df_bet_info = sports_betting.create_df_with_lines(uid_timestamp)
+    get_line_store().write(df_bet_info, website, sport, sports_betting.uid_timestamp)
+
+    job_metrics = sports_betting.metrics.to_dict()
+    if multiprocessing.parent_process() is not None:
+        # The http client of the parent never sees the requests of a job run in a process pool, so they are
+        # handed back with the job. A pool process runs one job at a time, so its aggregates are this job's
+        job_metrics["http_latency"] = get_http_client().latency_summary(reset=True)
+
+    return (
+        df_bet_info,
+        time.perf_counter() - start_time,
+        job_metrics,
+        sports_betting.uid_timestamp,
+        sports_betting.all_games_snapshot
+    )
+
+
+def collect_job(
+        website: str,
+        sport: str,
+        future,
+        quote_book=None
+):
+    """
+    Gather a finished job: add its lines to the line history and the quote book
+
+    Runs in the process that started the job since only one process can write to the DuckDB database
+
+    :param website: website of the job
+    :param sport: sport of the job
+    :param future: finished future of run_job
+    :param quote_book: QuoteBook to update with the lines of the job, if any
+    :return: dict with status, dataframe, error, seconds, metrics, payload_changed (whether all_games differed
+        from the previous download, None if unknown), changed_quotes (number of prices that moved since the
+        previous run, None if unknown) and changed_opportunities (number of opportunities opened, changed or closed,
+        None without a quote book)
+    """
+
+    from utility.line_history import get_line_history
+
+    result = {
+        "status": "failure",
+        "df": None,
+        "error": None,
+        "seconds": None,
+        "metrics": None,
+        "payload_changed": None,
+        "changed_quotes": None,
+        "changed_opportunities": None
+    }
+
+    try:
+        df_bet_info, seconds, job_metrics, job_uid_timestamp, all_games_snapshot = future.result()
+    except Exception as e:
+        result["error"] = repr(e)
+        logger.info(f"{website} / {sport} failed : {e!r}")
+        return result
+
+    result.update({
+        "status": "success",
+        "df": df_bet_info,
+        "seconds": seconds,
+        "metrics": job_metrics,
+        "payload_changed": all_games_snapshot["changed"] if all_games_snapshot is not None else None
+    })
+    logger.info(f"{website} / {sport} succeeded with {len(df_bet_info)} lines in {seconds:.2f} seconds")
+
+    if quote_book is not None:
+        quote_book.update(df_bet_info, website, sport)
+        changed_opportunities, closed_markets = quote_book.evaluate()
+        # A closed opportunity changes arbitrage.csv as much as a new one
+        result["changed_opportunities"] = len(changed_opportunities) + len(closed_markets)
+
+    try:
+        result["changed_quotes"] = get_line_history().ingest(df_bet_info, website, sport, job_uid_timestamp)
+    except Exception as e:
+        logger.info(f"{website} / {sport} lines could not be added to the line history : {e!r}")
+
+    return result
+
+
+def main(
+        website_filter: str=None,
+        uid_timestamp: str=None,
+        max_workers: int=None,
+        executor_type: str="thread",
+        quote_book=None
+):
+    """
+    Run every website/sport job concurrently and gather the resulting dataframes
+
+    :param website_filter: website to call API for
     :param uid_timestamp: specific timestamp from a prior run to load data for.
         When this is provided, new data will not be extracted, rather data will be read
             from the folder with the given website / timestamp
         This can be used for testing / when you don't want to make an actual call to the
             given website, so instead you just read in the data from a prior run
-    :return: None
+    :param max_workers: number of jobs run at the same time (defaults to one worker per job)
+    :param executor_type: "thread" or "process" pool to run the jobs in
+    :param quote_book: long lived QuoteBook updated as each job finishes, so that arbitrage is only
+        re-evaluated for the markets that changed. Without it arbitrage is computed from scratch over every job
+    :return: dict of (website, sport) to dict with status, dataframe, error and seconds
+        The arbitrage opportunities across the successful jobs are written to arbitrage.csv in the output directory
     """
 
-    sports_betting_info = read_json_file(f"{Path(__file__).parents[0]}/constants/betting_sites_info.json")
+    from utility.http_client import get_http_client
+    from arbitrage.arbitrage import find_arbitrage
 
-    for website, website_info in sports_betting_info.items():
+    jobs = list_jobs(website_filter)
 
-        if website_filter is not None:
-            if website != website_filter:
-                print(f"website = {website} so skipping!!")
-                continue
+    results = {}
+    if len(jobs) == 0:
+        return results
 
-        logger.info(f"website = {website}")
-        website_base_url = website_info["website_base_url"]
-        logger.info(f"base_url = {website_base_url}")
-        if uid_timestamp is None:
-            uid_timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        logger.info(f"uid_timestamp = {uid_timestamp}")
+    metrics = RunMetrics("sports_betting")
 
-        for sport in website_info["sports"]:
-            logger.info(f"sport = {sport}")
-            extracted_data_files_directory = f"{Path(__file__).parents[0]}/extracted_data_files/{website}/{sport}/{uid_timestamp}"
-            logger.info(f"extracted_data_files_directory = {extracted_data_files_directory}")
+    executor_class = ProcessPoolExecutor if executor_type == "process" else ThreadPoolExecutor
+    max_workers = max_workers if max_workers is not None else len(jobs)
+    logger.info(f"Running {len(jobs)} jobs with {max_workers} {executor_type} workers")
+
+    with metrics.span("run_jobs") as span, executor_class(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(run_job, website, sport, uid_timestamp): (website, sport)
+            for website, sport in jobs
+        }
+
+        # Gather each job as soon as it finishes so a slow website does not hold up the others
+        for future in as_completed(futures):
+            website, sport = futures[future]
+            results[(website, sport)] = collect_job(website, sport, future, quote_book)
+            if results[(website, sport)]["status"] == "success":
+                span["records"] += len(results[(website, sport)]["df"])
+
+    for (website, sport), result in results.items():
+        logger.info(f"Job {website} / {sport} : {result['status']}")
+
+    with metrics.span("arbitrage") as span:
+        if quote_book is not None:
+            df_arbitrage = quote_book.opportunities_df()
+        else:
+            dfs_bet_info = [result["df"] for result in results.values() if result["status"] == "success"]
+            df_arbitrage = find_arbitrage(dfs_bet_info)
+        span["records"] = len(df_arbitrage)
+    df_arbitrage.to_csv(os.path.join(get_output_directory(), "arbitrage.csv"), index=False)
+
+    metrics.attributes["jobs"] = {
+        f"{website}/{sport}": {key: value for key, value in result.items() if key != "df"}
+        for (website, sport), result in results.items()
+    }
+    metrics_directory = os.path.join(get_output_directory(), "metrics")
+    create_directory(metrics_directory, False)
+    metrics.write(metrics_directory, f"{datetime.now().strftime('%Y%m%d%H%M%S')}.json")
+
+    http_client = get_http_client()
+    for result in results.values():
+        if result["metrics"] is not None and "http_latency" in result["metrics"]:
+            http_client.add_latency_summary(result["metrics"]["http_latency"])
+    http_client.log_latency_summary()
 
-            if website == "bovada":
-                bovada_create_df_with_lines(extracted_data_files_directory)
-            elif website == "betfair":
-                betfair_create_df_with_lines(extracted_data_files_directory)
+    return results
 
 
 if __name__ == "__main__":
@@ -60,14 +265,13 @@ if __name__ == "__main__":
     parser.add_argument("--website", dest="website_filter", required=False, type=str,
                         help="Website to pull data from")
     parser.add_argument("--uid-timestamp", dest="uid_timestamp", required=False, type=int,
-                        help="YYYYMMDDHHMMSS timestamp folder that files are saved to")
+                        help="YYYYMMDDHHMMSS timestamp folder of a prior run to read files from instead of calling the websites")
+    parser.add_argument("--workers", dest="max_workers", required=False, type=int,
+                        help="Number of website/sport jobs run at the same time (defaults to all of them)")
+    parser.add_argument("--executor", dest="executor_type", required=False, type=str, default="thread",
+                        choices=["thread", "process"], help="Run the jobs in a thread pool or a process pool")
     args = parser.parse_args()
-    website_filter = args.website_filter
-    if args.uid_timestamp is None:
-        uid_timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    else:
-        uid_timestamp = args.uid_timestamp
 
-    logger.info(f"UID_TIMESTAMP = {uid_timestamp}")
+    logger.info(f"UID_TIMESTAMP = {args.uid_timestamp}")
 
-    main(website_filter, uid_timestamp)
\ No newline at end of file
+    main(args.website_filter, args.uid_timestamp, args.max_workers, args.executor_type)
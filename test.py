@@ -1,7 +1,7 @@
 import duckdb
 import pandas as pd
 import os
-from utility.helper_functions import get_output_directory
+from utility.line_store import get_line_store
 
 
 def query_duckdb(query, con):
@@ -9,11 +9,11 @@ def query_duckdb(query, con):
     return result
 
 
-output_directory = get_output_directory()
+line_store = get_line_store()
 
 
-df_bovada = pd.read_csv(os.path.join(output_directory, "bovada.csv"))
-df_betfair = pd.read_csv(os.path.join(output_directory, "betfair.csv"))
+df_bovada = line_store.read_latest("bovada", "basketball")
+df_betfair = line_store.read_latest("betfair", "basketball")
 
 
 con = duckdb.connect(database=':memory:')
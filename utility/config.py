@@ -0,0 +1,449 @@
+import json
+import os
+import threading
+from dataclasses import dataclass, fields, is_dataclass, MISSING
+from pathlib import Path
+from types import MappingProxyType
+
+
+CONSTANTS_DIRECTORY = f"{Path(__file__).parents[1]}/constants"
+
+_config_registry = None
+_config_registry_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class RateLimitConfig:
+    """
+    Rate limit of the requests to a host, see FetchScheduler
+
+    The trade-off is politeness against how long a run takes. Betfair event pages used to be fetched one at a time
+    with 10 to 20 seconds between them. Its event_page_rate_limit keeps close to that: one page every 10 seconds on
+    average plus 0 to 5 seconds of jitter, and a burst of only 2 pages back to back after an idle period. A larger
+    burst or max_concurrency makes a run faster but sends the website a spike of requests at its start, so the
+    sustained rate is what to tune, together with the request_budget of event_page_refresh (40 pages take about
+    7 minutes at this rate)
+    """
+
+    # Sustained requests per second, the long run average once the burst is spent
+    requests_per_second: float
+    # Requests sent back to back after an idle period, keep it at 1 to 3 to stay polite
+    burst: int = 1
+    # [min, max] random seconds added before every request
+    jitter_seconds: tuple = None
+    # Downloads in flight at once, more than burst only helps when the responses are slower than the rate
+    max_concurrency: int = 1
+
+
+@dataclass(frozen=True)
+class EventRefreshConfig:
+    """
+    How often the event pages of a website are refreshed and how many per run, see RefreshScheduler
+    """
+
+    min_refresh_seconds: float
+    max_refresh_seconds: float
+    refresh_seconds_per_minute_to_start: float
+    volatility_decay: float
+    request_budget: int = None
+
+
+@dataclass(frozen=True)
+class WebsiteConfig:
+    """
+    Entry of betting_sites_info.json for a single website
+    """
+
+    website_base_url: str
+    sports: tuple
+    html_parser: str = None
+    coupon_prices: bool = False
+    parse_processes: int = None
+    event_page_rate_limit: RateLimitConfig = None
+    event_page_refresh: EventRefreshConfig = None
+
+
+@dataclass(frozen=True)
+class SearchElem:
+    """
+    Entry of betfair_search_elems.json: a minimarket bet type of the Betfair event pages, and the position
+    of its market among the market columns of the coupon lines, if it is shown there
+    """
+
+    bet_type: str
+    bet_type_normalized: str
+    has_teams: bool
+    has_handicap: bool
+    coupon_column: int = None
+
+
+@dataclass(frozen=True)
+class MarketType:
+    """
+    Entry of bovada_market_types.json: a Bovada market kept and the bet type it is normalized to
+    """
+
+    display_group: str
+    description_key: str
+    description: str
+    bet_type_normalized: str
+
+
+@dataclass(frozen=True)
+class DataframeHeaders:
+    """
+    Contents of dataframe_headers.json
+    """
+
+    df_event_headers: tuple
+    df_records_headers: tuple
+    df_event_key_headers: tuple
+    df_records_key_headers: tuple
+    df_column_dtypes: MappingProxyType
+
+
+@dataclass(frozen=True)
+class HttpClientConfig:
+    """
+    Contents of http_client.json, the keyword arguments of HttpClient
+    """
+
+    connect_timeout_seconds: float
+    read_timeout_seconds: float
+    max_retries: int
+    backoff_factor: float
+    retry_status_codes: tuple
+    pool_maxsize: int
+
+
+@dataclass(frozen=True)
+class LoggingConfig:
+    """
+    Contents of logging.json, the defaults of configure_logging
+    """
+
+    level: str
+    use_queue: bool
+    json_loggers: tuple
+    debug_sample_rate: float
+
+
+@dataclass(frozen=True)
+class WorkerConfig:
+    """
+    Contents of worker.json, the address of the resident worker. Its authkey is never in the repo, see worker.get_authkey
+    """
+
+    host: str
+    port: int
+
+
+@dataclass(frozen=True)
+class PollIntervalConfig:
+    """
+    How the interval between polls of a website / sport adapts, see PollSchedule
+    """
+
+    initial_interval_seconds: float
+    min_interval_seconds: float
+    max_interval_seconds: float
+    speedup_factor: float
+    backoff_factor: float
+    error_backoff_factor: float
+    latency_multiplier: float
+
+
+@dataclass(frozen=True)
+class PollerConfig:
+    """
+    Contents of poller.json: the global concurrency cap and the poll intervals, per website when overridden
+    """
+
+    max_concurrency: int
+    intervals: PollIntervalConfig
+    website_intervals: MappingProxyType
+
+    def get_intervals(
+            self,
+            website: str
+    ):
+        """
+        Retrieve the poll interval config of a website
+
+        :param website: website to be polled
+        :return: PollIntervalConfig of the website, the default one when it is not overridden
+        """
+
+        return self.website_intervals.get(website, self.intervals)
+
+
+def freeze(value):
+    """
+    Make parsed json immutable: dicts become read-only mappings and lists become tuples
+
+    :param value: parsed json
+    :return: immutable copy of the value
+    """
+
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+
+    return value
+
+
+def build_config(
+        config_class,
+        data: dict,
+        source: str
+):
+    """
+    Validate parsed json against a config dataclass and create the frozen config
+
+    :param config_class: frozen dataclass of the config
+    :param data: parsed json object
+    :param source: file (and key) the data comes from, used in error messages
+    :return: instance of config_class
+    """
+
+    if not isinstance(data, dict):
+        raise ValueError(f"{source} : expected an object, got {type(data).__name__}")
+
+    config_fields = {config_field.name: config_field for config_field in fields(config_class)}
+
+    unknown_keys = [key for key in data if key not in config_fields]
+    if len(unknown_keys) > 0:
+        raise ValueError(f"{source} : unknown keys {unknown_keys}")
+
+    kwargs = {}
+    for name, config_field in config_fields.items():
+        if name not in data:
+            if config_field.default is MISSING:
+                raise ValueError(f"{source} : missing key {name}")
+            continue
+
+        value = data[name]
+        if value is None and config_field.default is None:
+            kwargs[name] = None
+        elif is_dataclass(config_field.type):
+            kwargs[name] = build_config(config_field.type, value, f"{source}.{name}")
+        else:
+            kwargs[name] = check_type(config_field.type, value, f"{source}.{name}")
+
+    return config_class(**kwargs)
+
+
+def check_type(
+        expected_type,
+        value,
+        source: str
+):
+    """
+    Check the type of a json value and freeze it
+
+    :param expected_type: str, int, float, bool, tuple or MappingProxyType
+    :param value: parsed json value
+    :param source: file and key the value comes from, used in error messages
+    :return: frozen value
+    """
+
+    json_types = {
+        str: (str,),
+        int: (int,),
+        # Whole numbers are valid floats in json
+        float: (int, float),
+        bool: (bool,),
+        tuple: (list,),
+        MappingProxyType: (dict,)
+    }
+
+    # bool is a subclass of int, but true is not a valid number of anything
+    if not isinstance(value, json_types[expected_type]) or (expected_type is not bool and isinstance(value, bool)):
+        raise ValueError(f"{source} : expected {expected_type.__name__}, got {type(value).__name__}")
+
+    return freeze(value)
+
+
+def load_poller_config(
+        data: dict,
+        source: str
+):
+    """
+    Create the PollerConfig of poller.json, where a website only lists the interval settings it overrides
+
+    :param data: parsed json of poller.json
+    :param source: file the data comes from, used in error messages
+    :return: PollerConfig
+    """
+
+    intervals = build_config(PollIntervalConfig, data["intervals"], f"{source}:intervals")
+    website_intervals = {
+        website: build_config(PollIntervalConfig, {**data["intervals"], **overrides}, f"{source}:website_intervals.{website}")
+        for website, overrides in data.get("website_intervals", {}).items()
+    }
+
+    return PollerConfig(
+        max_concurrency=check_type(int, data["max_concurrency"], f"{source}:max_concurrency"),
+        intervals=intervals,
+        website_intervals=MappingProxyType(website_intervals)
+    )
+
+
+# Loader of each known file under constants/, from its parsed json to its frozen config.
+# Files without a loader are frozen as they are
+CONFIG_LOADERS = {
+    "betting_sites_info.json": lambda data, source: MappingProxyType({
+        website: build_config(WebsiteConfig, website_info, f"{source}:{website}")
+        for website, website_info in data.items()
+    }),
+    "betfair_search_elems.json": lambda data, source: tuple(
+        build_config(SearchElem, search_elem, f"{source}:search_elems")
+        for search_elem in data["search_elems"]
+    ),
+    "bovada_market_types.json": lambda data, source: tuple(
+        build_config(MarketType, market_type, f"{source}:market_types")
+        for market_type in data["market_types"]
+    ),
+    "dataframe_headers.json": lambda data, source: build_config(DataframeHeaders, data, source),
+    "http_client.json": lambda data, source: build_config(HttpClientConfig, data, source),
+    "logging.json": lambda data, source: build_config(LoggingConfig, data, source),
+    "poller.json": load_poller_config,
+    "worker.json": lambda data, source: build_config(WorkerConfig, data, source)
+}
+
+
+class ConfigRegistry:
+    def __init__(
+            self,
+            constants_directory: str
+    ):
+        """
+        Every file under constants/, loaded and validated once into immutable config objects
+
+        Lookups never touch the disk. A long lived process can pick up edited files with reload_changed
+
+        :param constants_directory: directory of the json config files
+        """
+
+        self.constants_directory = constants_directory
+        self.lock = threading.Lock()
+        # File name to its config object and to the mtime of the file when it was loaded
+        self.configs = {}
+        self.mtimes = {}
+
+        for file_name in self.list_config_files():
+            self.load(file_name)
+
+    def list_config_files(self):
+        """
+        List the json files under the constants directory
+
+        :return: sorted list of file names
+        """
+
+        return sorted(file_name for file_name in os.listdir(self.constants_directory) if file_name.endswith(".json"))
+
+    def load(
+            self,
+            file_name: str
+    ):
+        """
+        Read and validate a single config file, replacing its config only if it is valid
+
+        :param file_name: name of the file under the constants directory, e.g. betting_sites_info.json
+        :return: config object of the file
+        """
+
+        file_path = os.path.join(self.constants_directory, file_name)
+        mtime = os.path.getmtime(file_path)
+
+        with open(file_path) as f:
+            try:
+                data = json.loads(f.read())
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{file_name} : invalid json : {e}") from e
+
+        try:
+            loader = CONFIG_LOADERS.get(file_name)
+            config = loader(data, file_name) if loader is not None else freeze(data)
+        except (KeyError, AttributeError, TypeError) as e:
+            raise ValueError(f"{file_name} : unexpected layout : {e!r}") from e
+
+        with self.lock:
+            self.configs[file_name] = config
+            self.mtimes[file_name] = mtime
+
+        return config
+
+    def get(
+            self,
+            file_name: str
+    ):
+        """
+        Retrieve the config of a file, without any disk access
+
+        :param file_name: name of the file under the constants directory, e.g. betting_sites_info.json
+        :return: config object of the file
+        """
+
+        try:
+            return self.configs[file_name]
+        except KeyError:
+            raise KeyError(f"No config file {file_name} under {self.constants_directory}") from None
+
+    def reload_changed(self):
+        """
+        Reload the files whose mtime changed since they were loaded, and load new files
+
+        Meant to be called between polls of a long lived process. A file that fails validation keeps its previous
+        config and is not read again until it is edited, the other files are still reloaded. Once every file was
+        checked, ValueError is raised with the errors of the invalid files
+
+        :return: list of the names of the files that were reloaded
+        """
+
+        reloaded = []
+        errors = []
+        for file_name in self.list_config_files():
+            mtime = os.path.getmtime(os.path.join(self.constants_directory, file_name))
+            if self.mtimes.get(file_name) != mtime:
+                try:
+                    self.load(file_name)
+                    reloaded.append(file_name)
+                except ValueError as e:
+                    with self.lock:
+                        self.mtimes[file_name] = mtime
+                    errors.append(str(e))
+
+        if len(errors) > 0:
+            raise ValueError(f"Reloaded {reloaded}, kept the previous config of the invalid files : {errors}")
+
+        return reloaded
+
+
+def get_config_registry():
+    """
+    Retrieve the ConfigRegistry shared by the whole process, loading constants/ on first use
+
+    :return: ConfigRegistry
+    """
+
+    global _config_registry
+
+    with _config_registry_lock:
+        if _config_registry is None:
+            _config_registry = ConfigRegistry(CONSTANTS_DIRECTORY)
+
+    return _config_registry
+
+
+def get_config(file_name: str):
+    """
+    Retrieve the config of a file under constants/
+
+    :param file_name: name of the file, e.g. betting_sites_info.json
+    :return: config object of the file
+    """
+
+    return get_config_registry().get(file_name)
@@ -0,0 +1,172 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from utility.helper_functions import extract_from_url
+from utility.logging_utils import create_logger
+
+
+logger = create_logger(name=__name__)
+
+
+class TokenBucket:
+    def __init__(
+            self,
+            requests_per_second: float,
+            burst: int=1,
+            jitter_seconds: list=None
+    ):
+        """
+        Token bucket used to keep requests to a single host within a rate limit
+
+        :param requests_per_second: rate at which tokens are added to the bucket
+        :param burst: maximum number of tokens the bucket can hold
+        :param jitter_seconds: [min, max] random seconds added on top of every wait
+        """
+
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.jitter_seconds = jitter_seconds if jitter_seconds is not None else [0, 0]
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take a token from the bucket, going into debt if the bucket is empty
+
+        :return: number of seconds the caller must wait before using the token
+        """
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.requests_per_second)
+            self.last_refill = now
+            self.tokens -= 1
+
+            if self.tokens >= 0:
+                wait_seconds = 0
+            else:
+                wait_seconds = -self.tokens / self.requests_per_second
+
+        return wait_seconds + random.uniform(*self.jitter_seconds)
+
+    def acquire(self):
+        """
+        Block until a token is available
+
+        :return: number of seconds spent waiting
+        """
+
+        wait_seconds = self.reserve()
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+
+        return wait_seconds
+
+
+class FetchScheduler:
+    def __init__(
+            self,
+            requests_per_second: float,
+            burst: int=1,
+            jitter_seconds: list=None,
+            max_concurrency: int=1
+    ):
+        """
+        Run url downloads concurrently while keeping each host within its rate limit
+
+        :param requests_per_second: sustained requests per second allowed for each host
+        :param burst: number of requests a host may receive back to back before being throttled
+        :param jitter_seconds: [min, max] random seconds added before every request
+        :param max_concurrency: maximum number of downloads in flight at once
+        """
+
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.jitter_seconds = jitter_seconds
+        self.max_concurrency = max_concurrency
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(
+            cls,
+            rate_limit_config
+    ):
+        """
+        Create a scheduler from a rate limit block of betting_sites_info.json
+
+        :param rate_limit_config: RateLimitConfig with requests_per_second, burst, jitter_seconds and max_concurrency
+        :return: FetchScheduler
+        """
+
+        return cls(
+            requests_per_second=rate_limit_config.requests_per_second,
+            burst=rate_limit_config.burst,
+            jitter_seconds=rate_limit_config.jitter_seconds,
+            max_concurrency=rate_limit_config.max_concurrency
+        )
+
+    def get_bucket(
+            self,
+            url: str
+    ):
+        """
+        Retrieve the token bucket for the host of the url, creating it if needed
+
+        :param url: url to be called
+        :return: TokenBucket for the host
+        """
+
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.requests_per_second, self.burst, self.jitter_seconds)
+            return self.buckets[host]
+
+    def fetch(
+            self,
+            url: str,
+            file_path: str
+    ):
+        """
+        Wait for the host's rate limit and then call the url and save to file
+
+        :param url: url of the website to be called
+        :param file_path: full name of the file path where extracted data is to be saved
+        :return: dict with the body digest, whether it changed since the last call, the status code,
+            the bytes received and the seconds waited for the rate limit
+        """
+
+        wait_seconds = self.get_bucket(url).acquire()
+        logger.info(f"Waited {wait_seconds:.2f} seconds before calling {url}")
+
+        snapshot = extract_from_url(url=url, file_path=file_path)
+        snapshot["wait_seconds"] = wait_seconds
+
+        return snapshot
+
+    def fetch_all(
+            self,
+            fetch_jobs: list
+    ):
+        """
+        Download every (url, file_path) job concurrently
+
+        :param fetch_jobs: list of (url, file_path) tuples
+        :return: list in the same order as fetch_jobs with the snapshot dict of a successful download
+            or the exception raised while downloading
+        """
+
+        def run_job(fetch_job):
+            url, file_path = fetch_job
+            try:
+                return self.fetch(url, file_path)
+            except Exception as e:
+                logger.info(f"Exception calling {url} : {e}")
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            return list(executor.map(run_job, fetch_jobs))
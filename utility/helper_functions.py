@@ -1,12 +1,25 @@
-import requests
 import os
-from bs4 import BeautifulSoup
 import json
+import re
+import threading
+from functools import lru_cache
 from pathlib import Path
 from utility.logging_utils import create_logger
 
+# bs4, requests and the HTTP modules are imported where they are used, so that
+# importing this module (e.g. to trigger a warm worker) stays cheap
 
-logger = create_logger()
+
+logger = create_logger(name=__name__)
+
+# Overrides the base directory of every file written, e.g. to keep a benchmark away from the real data
+BASE_DIRECTORY_ENVIRONMENT_VARIABLE = "SPORTS_ARBITRAGE_DATA_DIRECTORY"
+
+_http_cache = None
+_http_cache_lock = threading.Lock()
+
+# Characters that change the nesting depth or string state while scanning json text
+_json_structure_pattern = re.compile(r'["\\\[\]{}]')
 
 
 def create_directory(
@@ -34,7 +47,8 @@ def create_directory(
     
     if not os.path.exists(file_path):
         logger.info(f"Created path at : {file_path}")
-        os.makedirs(file_path)
+        # exist_ok since concurrent jobs may create the same directory at the same time
+        os.makedirs(file_path, exist_ok=True)
     else:
         logger.info(f"Path already exists : {file_path}")
 
@@ -44,39 +58,96 @@ def extract_from_url(
         file_path: str
 ):
     """
-    Call the url and save to file
+    Call the url through the shared pooled HTTP client and save to file
+
+    The request is conditional on the ETag / Last-Modified of the previous call of the url and
+    the body is stored once by content hash, so file_path only references the stored body
 
     :param url: url of the website to be called by requests
     :param file_path: full name of the file path where extracted data is to be saved
-    :return: True
+    :return: dict with the body digest, whether it changed since the last call, the status code
+        and the bytes received
     """
 
+    from utility.http_client import get_http_client
+
     create_directory(file_path)
 
     logger.info(f"Calling url : {url}")
-    page = requests.get(url)
+    http_cache = get_http_cache()
+    page = get_http_client().get(url, headers=http_cache.conditional_headers(url))
+
+    snapshot = http_cache.store(url, page)
+    http_cache.link_snapshot(snapshot["digest"], file_path)
+    logger.info(f"HTML {snapshot['digest']} written to {file_path}")
+
+    return snapshot
+
+
+def get_http_cache():
+    """
+    Retrieve the HttpCache shared by the whole process, creating it on first use
+
+    :return: HttpCache
+    """
+
+    from utility.http_cache import HttpCache
+
+    global _http_cache
+
+    with _http_cache_lock:
+        if _http_cache is None:
+            _http_cache = HttpCache(os.path.join(get_base_directory(), "http_cache"))
+
+    return _http_cache
+
+
+@lru_cache(maxsize=None)
+def get_html_parser(
+        html_parser: str=None
+):
+    """
+    Retrieve the Beautiful Soup parser backend to use
+
+    :param html_parser: preferred parser ("lxml" or "html.parser"), defaults to html.parser. lxml is only used
+        when asked for, e.g. through the html_parser of a website in betting_sites_info.json, since the two parsers
+        build different trees from malformed markup
+    :return: name of the parser, falling back to html.parser when lxml is not installed
+    """
+
+    html_parser = html_parser if html_parser is not None else "html.parser"
 
-    with open(file_path, "w") as f:
-        f.write(page.text)
-        logger.info(f"HTML written to {file_path}")
+    if html_parser == "lxml":
+        try:
+            import lxml
+        except ImportError:
+            logger.info("lxml is not installed so using html.parser")
+            return "html.parser"
 
-    return True
+    return html_parser
 
 
 def read_html_data(
-        file_path: str
+        file_path: str,
+        parse_only=None,
+        html_parser: str=None
 ):
     """
+    Read an html file and parse it with Beautiful Soup
 
     :param file_path: full name of file path where the file to be read resides
+    :param parse_only: SoupStrainer so that only the matching tags (and their contents) are built into the tree
+    :param html_parser: parser backend, see get_html_parser
     :return: html file parsed with Beautiful Soup
     """
 
+    from bs4 import BeautifulSoup
+
     with open(file_path, "r") as f:
         logger.info(f"Reading data from : {file_path}")
         html = f.read()
 
-    return BeautifulSoup(str.encode(html), "html.parser")
+    return BeautifulSoup(html, get_html_parser(html_parser), parse_only=parse_only)
 
 
 def read_json_file(file_path: str):
@@ -94,14 +165,88 @@ def read_json_file(file_path: str):
     return data
 
 
+def iter_json_array(
+        file_path: str,
+        must_contain: tuple=None,
+        chunk_size: int=65536
+):
+    """
+    Read a json file whose top level is an array of objects and yield the objects one at a time
+
+    The file is read in chunks and only the text of the current object is kept in memory
+
+    :param file_path: full file path of the json file (directory + file name)
+    :param must_contain: if provided, objects whose raw text contains none of these strings
+        are skipped without being decoded
+    :param chunk_size: number of characters read from the file at a time
+    :return: generator of decoded objects
+    """
+
+    with open(file_path) as f:
+        logger.info(f"Streaming JSON from : {file_path}")
+
+        buffer = ""
+        position = 0
+        element_start = None
+        depth = 0
+        in_string = False
+        end_of_file = False
+
+        while True:
+            match = _json_structure_pattern.search(buffer, position)
+
+            if match is None:
+                if end_of_file is True:
+                    return
+
+                # Drop the text already scanned that is not part of the current object
+                keep_from = element_start if element_start is not None else min(position, len(buffer))
+                chunk = f.read(chunk_size)
+                end_of_file = chunk == ""
+                buffer = buffer[keep_from:] + chunk
+                position -= keep_from
+                if element_start is not None:
+                    element_start = 0
+                continue
+
+            char = match.group()
+            index = match.start()
+            position = index + 1
+
+            if in_string is True:
+                if char == "\\":
+                    # Skip the escaped character, which may not have been read yet
+                    position = index + 2
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in "[{":
+                if depth == 1:
+                    element_start = index
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 1 and element_start is not None:
+                    element_text = buffer[element_start:position]
+                    element_start = None
+                    if must_contain is None or any(text in element_text for text in must_contain):
+                        yield json.loads(element_text)
+                elif depth == 0:
+                    return
+
+
 def get_base_directory():
     """
     Create the base directory if it doesn't yet exist
 
-    return: the base directory
+    return: the base directory, ~/sports_arbitrage_data unless set in the SPORTS_ARBITRAGE_DATA_DIRECTORY
+        environment variable
     """
 
-    sports_arbitrage_data_directory = os.path.join(os.path.expanduser('~'), "sports_arbitrage_data")
+    sports_arbitrage_data_directory = os.environ.get(BASE_DIRECTORY_ENVIRONMENT_VARIABLE)
+    if not sports_arbitrage_data_directory:
+        sports_arbitrage_data_directory = os.path.join(os.path.expanduser('~'), "sports_arbitrage_data")
 
     create_directory(
         sports_arbitrage_data_directory, 
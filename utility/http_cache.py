@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from utility.logging_utils import create_logger
+
+
+logger = create_logger(name=__name__)
+
+
+class HttpCache:
+    def __init__(
+            self,
+            cache_directory: str
+    ):
+        """
+        Cache of validators (ETag / Last-Modified) per url and content-addressed response bodies
+
+        :param cache_directory: directory where the url index and the bodies are stored
+        """
+
+        self.cache_directory = cache_directory
+        self.blobs_directory = os.path.join(cache_directory, "blobs")
+        self.index_file_path = os.path.join(cache_directory, "index.json")
+        self.lock = threading.Lock()
+        # Urls whose entry changed since the index was last saved
+        self.changed_urls = set()
+
+        os.makedirs(self.blobs_directory, exist_ok=True)
+
+        if os.path.exists(self.index_file_path):
+            with open(self.index_file_path) as f:
+                self.index = json.loads(f.read())
+        else:
+            self.index = {}
+
+    def get_blob_path(
+            self,
+            digest: str
+    ):
+        """
+        Retrieve the path where the body with the given digest is stored
+
+        :param digest: sha256 hex digest of the body
+        :return: full path of the body
+        """
+
+        return os.path.join(self.blobs_directory, digest[:2], digest)
+
+    def conditional_headers(
+            self,
+            url: str
+    ):
+        """
+        Build the conditional request headers for a url that was fetched before
+
+        :param url: url to be called
+        :return: dict of If-None-Match / If-Modified-Since headers (empty if the url is not cached)
+        """
+
+        with self.lock:
+            url_entry = self.index.get(url)
+
+        headers = {}
+        if url_entry is None or not os.path.exists(self.get_blob_path(url_entry["digest"])):
+            return headers
+
+        if url_entry.get("etag") is not None:
+            headers["If-None-Match"] = url_entry["etag"]
+        if url_entry.get("last_modified") is not None:
+            headers["If-Modified-Since"] = url_entry["last_modified"]
+
+        return headers
+
+    def store(
+            self,
+            url: str,
+            response
+    ):
+        """
+        Store a successful response body once by content hash and remember its validators for the url
+
+        The index is only updated in memory, see save_index
+
+        :param url: url that was called
+        :param response: requests Response, either a 2xx with a body or a 304 for a cached url
+        :return: dict with the body digest, whether it changed since the last call of the url,
+            the status code and the number of bytes received
+        """
+
+        if response.status_code != 304 and not 200 <= response.status_code < 300:
+            from requests import HTTPError
+            # An error page must neither replace the last good body nor be reused through its validators
+            raise HTTPError(f"{url} : status {response.status_code}, body not stored", response=response)
+
+        with self.lock:
+            previous_digest = self.index.get(url, {}).get("digest")
+
+        if response.status_code == 304:
+            logger.info(f"{url} not modified")
+            digest = previous_digest
+        else:
+            body = response.text.encode("utf-8")
+            digest = hashlib.sha256(body).hexdigest()
+            blob_path = self.get_blob_path(digest)
+
+            if not os.path.exists(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                temp_blob_path = f"{blob_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(temp_blob_path, "wb") as f:
+                    f.write(body)
+                os.replace(temp_blob_path, blob_path)
+                logger.info(f"Stored new body {digest} for {url}")
+            else:
+                logger.info(f"Body {digest} for {url} already stored")
+
+        with self.lock:
+            self.index[url] = {
+                "digest": digest,
+                "etag": response.headers.get("ETag", self.index.get(url, {}).get("etag")),
+                "last_modified": response.headers.get("Last-Modified", self.index.get(url, {}).get("last_modified"))
+            }
+            self.changed_urls.add(url)
+
+        return {
+            "digest": digest,
+            "changed": digest != previous_digest,
+            "status_code": response.status_code,
+            "bytes": len(response.content)
+        }
+
+    def save_index(self):
+        """
+        Write the url entries that changed to the index on disk, meant to be called once per run
+
+        The index on disk is read again first so that the entries saved by other processes meanwhile are kept
+
+        :return: None
+        """
+
+        with self.lock:
+            if len(self.changed_urls) == 0:
+                return
+
+            index = {}
+            if os.path.exists(self.index_file_path):
+                with open(self.index_file_path) as f:
+                    index = json.loads(f.read())
+            index.update({url: self.index[url] for url in self.changed_urls})
+
+            temp_index_file_path = f"{self.index_file_path}.{os.getpid()}.tmp"
+            with open(temp_index_file_path, "w") as f:
+                f.write(json.dumps(index))
+            os.replace(temp_index_file_path, self.index_file_path)
+
+            logger.info(f"Saved {len(self.changed_urls)} changed urls to {self.index_file_path}")
+            self.changed_urls.clear()
+
+    def link_snapshot(
+            self,
+            digest: str,
+            file_path: str
+    ):
+        """
+        Reference a stored body from a snapshot directory without writing it again
+
+        :param digest: sha256 hex digest of the body
+        :param file_path: full file path of the snapshot file
+        :return: None
+        """
+
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+        try:
+            os.link(self.get_blob_path(digest), file_path)
+        except OSError:
+            # Hard links are not supported everywhere (e.g. across devices) so fall back to a copy
+            shutil.copyfile(self.get_blob_path(digest), file_path)
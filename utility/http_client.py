@@ -0,0 +1,194 @@
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from utility.logging_utils import create_logger
+from utility.config import get_config
+
+
+logger = create_logger(name=__name__)
+
+_http_client = None
+_http_client_config = None
+_http_client_lock = threading.Lock()
+
+
+class HttpClient:
+    def __init__(
+            self,
+            connect_timeout_seconds: float=5,
+            read_timeout_seconds: float=30,
+            max_retries: int=3,
+            backoff_factor: float=1,
+            retry_status_codes: list=None,
+            pool_maxsize: int=10
+    ):
+        """
+        Pooled keep-alive HTTP client shared by every website
+
+        :param connect_timeout_seconds: seconds to wait for the connection to be established
+        :param read_timeout_seconds: seconds to wait between bytes received from the server
+        :param max_retries: maximum number of retries for connection errors and retry_status_codes
+        :param backoff_factor: retries wait backoff_factor * 2 ** (retry number - 1) seconds
+        :param retry_status_codes: HTTP status codes that should be retried
+        :param pool_maxsize: maximum number of connections kept alive per host
+        """
+
+        self.timeout = (connect_timeout_seconds, read_timeout_seconds)
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=retry_status_codes if retry_status_codes is not None else [429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(pool_maxsize=pool_maxsize, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive"
+        })
+
+        # Host to its running request count, total and max latency and bytes, so a long lived client stays small
+        self.host_latencies = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(
+            cls,
+            http_client_config
+    ):
+        """
+        Create a client from the contents of http_client.json
+
+        :param http_client_config: HttpClientConfig
+        :return: HttpClient
+        """
+
+        return cls(
+            connect_timeout_seconds=http_client_config.connect_timeout_seconds,
+            read_timeout_seconds=http_client_config.read_timeout_seconds,
+            max_retries=http_client_config.max_retries,
+            backoff_factor=http_client_config.backoff_factor,
+            retry_status_codes=list(http_client_config.retry_status_codes),
+            pool_maxsize=http_client_config.pool_maxsize
+        )
+
+    def get(
+            self,
+            url: str,
+            headers: dict=None
+    ):
+        """
+        Call the url and record how long the request took
+
+        :param url: url to be called
+        :param headers: extra headers to send with the request
+        :return: requests Response
+        """
+
+        start_time = time.perf_counter()
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        latency_seconds = time.perf_counter() - start_time
+
+        response_bytes = len(response.content)
+        self.add_latency_summary({
+            urlparse(url).netloc: {
+                "requests": 1,
+                "total_seconds": latency_seconds,
+                "max_seconds": latency_seconds,
+                "bytes": response_bytes
+            }
+        })
+
+        logger.info(f"GET {url} : status = {response.status_code}, latency = {latency_seconds:.3f}s, bytes = {response_bytes}")
+
+        return response
+
+    def add_latency_summary(
+            self,
+            summary: dict
+    ):
+        """
+        Add request latencies to the running aggregates of their hosts, e.g. the summary of a job run in another process
+
+        :param summary: dict of host to request count, total and max latency in seconds and bytes
+        :return: None
+        """
+
+        with self.lock:
+            for host, host_summary in summary.items():
+                host_latency = self.host_latencies.setdefault(host, {
+                    "requests": 0,
+                    "total_seconds": 0.0,
+                    "max_seconds": 0.0,
+                    "bytes": 0
+                })
+                host_latency["requests"] += host_summary["requests"]
+                host_latency["total_seconds"] += host_summary["total_seconds"]
+                host_latency["max_seconds"] = max(host_latency["max_seconds"], host_summary["max_seconds"])
+                host_latency["bytes"] += host_summary["bytes"]
+
+    def latency_summary(
+            self,
+            reset: bool=False
+    ):
+        """
+        Summarize the request latencies per host
+
+        :param reset: True to start the aggregates again from zero, so the next summary only covers later requests
+        :return: dict of host to request count, total, mean and max latency in seconds and bytes
+        """
+
+        with self.lock:
+            summary = {host: dict(host_latency) for host, host_latency in self.host_latencies.items()}
+            if reset is True:
+                self.host_latencies = {}
+
+        for host_summary in summary.values():
+            host_summary["mean_seconds"] = host_summary["total_seconds"] / host_summary["requests"]
+
+        return summary
+
+    def log_latency_summary(self):
+        """
+        Log the latency summary for every host called so far
+
+        :return: None
+        """
+
+        for host, host_summary in self.latency_summary().items():
+            logger.info(f"Latency for {host} : {host_summary}")
+
+
+def get_http_client():
+    """
+    Retrieve the HttpClient shared by the whole process, creating it on first use
+
+    A new client is created once http_client.json was reloaded, requests already running finish on the previous one
+    and its latency aggregates carry over
+
+    :return: HttpClient
+    """
+
+    global _http_client, _http_client_config
+
+    http_client_config = get_config("http_client.json")
+
+    with _http_client_lock:
+        if _http_client is None or http_client_config is not _http_client_config:
+            previous_http_client = _http_client
+            _http_client = HttpClient.from_config(http_client_config)
+            _http_client_config = http_client_config
+            if previous_http_client is not None:
+                logger.info("Created a new http client with the reloaded http_client.json")
+                # The latency summary still covers the requests of the previous client
+                _http_client.add_latency_summary(previous_http_client.latency_summary())
+
+    return _http_client
@@ -0,0 +1,262 @@
+import os
+import threading
+from datetime import datetime
+import pandas as pd
+from utility.helper_functions import get_base_directory
+from utility.logging_utils import create_logger
+from arbitrage.arbitrage import prepare_lines
+
+
+logger = create_logger(name=__name__)
+
+_line_history = None
+_line_history_lock = threading.Lock()
+
+# Columns of every quote, in table order
+QUOTE_COLUMNS = """
+    website VARCHAR NOT NULL,
+    sport VARCHAR NOT NULL,
+    polled_at TIMESTAMP NOT NULL,
+    event_key BIGINT NOT NULL,
+    bet_type VARCHAR NOT NULL,
+    market_line DOUBLE NOT NULL,
+    side VARCHAR NOT NULL,
+    event_id VARCHAR,
+    event_date DATE,
+    away_team VARCHAR,
+    home_team VARCHAR,
+    team VARCHAR,
+    team_key BIGINT,
+    handicap_spread DOUBLE,
+    american_line VARCHAR,
+    decimal_line DOUBLE NOT NULL
+"""
+
+# Columns that are NOT NULL in QUOTE_COLUMNS and come from the lines of a run
+NOT_NULL_LINE_COLUMNS = ["event_key", "bet_type", "market_line", "side", "decimal_line"]
+
+# Identity of a single quote: a side of a market on a website
+QUOTE_KEY = "website, sport, event_key, bet_type, market_line, side"
+
+SCHEMA = f"""
+    -- Every quote of every poll
+    CREATE TABLE IF NOT EXISTS lines ({QUOTE_COLUMNS});
+    CREATE INDEX IF NOT EXISTS lines_market_idx ON lines (event_key, bet_type, website);
+
+    -- Only the quotes whose price differs from the previous poll, so line movement never scans unchanged polls
+    CREATE TABLE IF NOT EXISTS line_changes ({QUOTE_COLUMNS}, previous_decimal_line DOUBLE);
+    CREATE INDEX IF NOT EXISTS line_changes_market_idx ON line_changes (event_key, bet_type, website);
+
+    -- The quotes of the last poll of each website / sport, i.e. every market that is still open
+    CREATE TABLE IF NOT EXISTS latest_quotes ({QUOTE_COLUMNS}, PRIMARY KEY ({QUOTE_KEY}));
+
+    CREATE OR REPLACE VIEW line_movement AS
+    SELECT website, sport, event_key, event_date, away_team, home_team, bet_type, market_line, side, team,
+           polled_at, previous_decimal_line, decimal_line, decimal_line - previous_decimal_line AS decimal_line_change
+    FROM line_changes;
+
+    CREATE OR REPLACE VIEW open_markets AS
+    SELECT * FROM latest_quotes WHERE event_date >= current_date;
+"""
+
+
+class LineHistory:
+    def __init__(
+            self,
+            database_path: str
+    ):
+        """
+        Persistent DuckDB store of the quotes of every run
+
+        Quotes are ingested straight from Arrow, without a csv round trip. Alongside the full history, the
+        latest quote of every open market and the quotes whose price moved are maintained at ingest time,
+        so that their queries do not depend on how long the store has been polled
+
+        :param database_path: full file path of the DuckDB database
+        """
+
+        import duckdb
+
+        self.database_path = database_path
+        self.connection = duckdb.connect(database_path)
+        self.lock = threading.Lock()
+
+        self.connection.execute(SCHEMA)
+
+    def ingest(
+            self,
+            df_bet_info: pd.DataFrame,
+            website: str,
+            sport: str,
+            uid_timestamp
+    ):
+        """
+        Store the lines of a single run, except the lines missing a column the quote tables require
+
+        Ingesting the same run again does nothing, and a run older than the latest stored one is only added to
+        the lines, so that replaying a prior run never moves the latest quotes back in time
+
+        :param df_bet_info: dataframe with lines as produced by create_df_with_lines
+        :param website: website the lines are from
+        :param sport: sport of the lines
+        :param uid_timestamp: YYYYMMDDHHMMSS timestamp of the run
+        :return: number of quotes whose price changed since the previous run, 0 for a run already stored or older
+            than the latest one
+        """
+
+        import pyarrow as pa
+
+        df_lines = prepare_lines(df_bet_info)
+        # A single line without e.g. a handicap or an over/under side would fail the whole transaction
+        is_complete = df_lines[NOT_NULL_LINE_COLUMNS].notna().all(axis=1)
+        if not is_complete.all():
+            logger.info(f"{website} / {sport} : {(~is_complete).sum()} lines dropped, "
+                        f"missing one of {NOT_NULL_LINE_COLUMNS}")
+            df_lines = df_lines[is_complete]
+        # Category columns become Arrow dictionaries, which DuckDB reads without copying them into Python
+        incoming = pa.Table.from_pandas(
+            df_lines[["event_key", "bet_type", "market_line", "side", "event_id", "event_date", "away_team", "home_team",
+                      "team", "team_key", "handicap_spread", "american_line", "decimal_line"]],
+            preserve_index=False
+        )
+        polled_at = datetime.strptime(str(uid_timestamp), "%Y%m%d%H%M%S")
+
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.register("incoming", incoming)
+            try:
+                cursor.execute("BEGIN TRANSACTION")
+
+                # A replayed run (e.g. --uid-timestamp) is already stored
+                already_stored = cursor.execute(
+                    "SELECT count(*) FROM lines WHERE website = ? AND sport = ? AND polled_at = ?", [website, sport, polled_at]
+                ).fetchone()[0] > 0
+                if already_stored is True:
+                    cursor.execute("COMMIT")
+                    logger.info(f"{website} / {sport} : run {uid_timestamp} already stored, not ingested again")
+                    return 0
+
+                # The latest quotes and the price changes only move forward, an older run only adds to the history
+                latest_polled_at = cursor.execute(
+                    "SELECT max(polled_at) FROM latest_quotes WHERE website = ? AND sport = ?", [website, sport]
+                ).fetchone()[0]
+                is_latest = latest_polled_at is None or polled_at >= latest_polled_at
+
+                # A website quoting the same side more than once keeps its best price
+                cursor.execute("""
+                    CREATE TEMP TABLE incoming_quotes AS
+                    SELECT ?::VARCHAR AS website, ?::VARCHAR AS sport, ?::TIMESTAMP AS polled_at,
+                           event_key, bet_type::VARCHAR AS bet_type, market_line, side, event_id::VARCHAR AS event_id,
+                           event_date::DATE AS event_date, away_team::VARCHAR AS away_team, home_team::VARCHAR AS home_team,
+                           team::VARCHAR AS team, team_key, handicap_spread, american_line::VARCHAR AS american_line, decimal_line
+                    FROM incoming
+                    QUALIFY row_number() OVER (PARTITION BY event_key, bet_type, market_line, side ORDER BY decimal_line DESC) = 1
+                """, [website, sport, polled_at])
+
+                cursor.execute("INSERT INTO lines SELECT * FROM incoming_quotes")
+
+                changed_quotes = 0
+                if is_latest is True:
+                    changed_quotes = cursor.execute(f"""
+                        INSERT INTO line_changes
+                        SELECT i.*, q.decimal_line
+                        FROM incoming_quotes AS i
+                        LEFT JOIN latest_quotes AS q USING ({QUOTE_KEY})
+                        WHERE q.decimal_line IS NULL OR q.decimal_line <> i.decimal_line
+                    """).fetchone()[0]
+
+                    # Markets the website stopped quoting are no longer open
+                    cursor.execute("DELETE FROM latest_quotes WHERE website = ? AND sport = ?", [website, sport])
+                    cursor.execute("INSERT INTO latest_quotes SELECT * FROM incoming_quotes")
+                else:
+                    logger.info(f"{website} / {sport} : run {uid_timestamp} is older than the latest stored run "
+                                f"{latest_polled_at}, only added to the history")
+
+                cursor.execute("DROP TABLE incoming_quotes")
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            finally:
+                cursor.unregister("incoming")
+                cursor.close()
+
+        logger.info(f"{website} / {sport} : {len(incoming)} quotes stored, {changed_quotes} changed")
+
+        return changed_quotes
+
+    def query(
+            self,
+            query: str,
+            parameters: list=None
+    ):
+        """
+        Run a query against the store
+
+        :param query: SQL query, e.g. on the lines, line_changes or latest_quotes tables
+            or the line_movement and open_markets views
+        :param parameters: values of the ? placeholders of the query
+        :return: pandas dataframe of the result
+        """
+
+        with self.lock:
+            cursor = self.connection.cursor()
+            try:
+                return cursor.execute(query, parameters).df()
+            finally:
+                cursor.close()
+
+    def open_markets(
+            self,
+            website: str=None
+    ):
+        """
+        Latest price of every open market
+
+        :param website: only the markets of this website, every website when None
+        :return: pandas dataframe with one row per website, market and side
+        """
+
+        if website is None:
+            return self.query("SELECT * FROM open_markets")
+
+        return self.query("SELECT * FROM open_markets WHERE website = ?", [website])
+
+    def line_movement(
+            self,
+            event_key: int,
+            bet_type: str=None
+    ):
+        """
+        Every price change of the markets of an event, per website
+
+        :param event_key: event_key of the event
+        :param bet_type: only the markets of this bet type, every bet type when None
+        :return: pandas dataframe of the changes ordered by market, side, website and time
+        """
+
+        query = "SELECT * FROM line_movement WHERE event_key = ?"
+        parameters = [event_key]
+        if bet_type is not None:
+            query += " AND bet_type = ?"
+            parameters.append(bet_type)
+
+        return self.query(f"{query} ORDER BY bet_type, market_line, side, website, polled_at", parameters)
+
+
+def get_line_history():
+    """
+    Retrieve the LineHistory shared by the whole process, opening the database on first use
+
+    Only one process can open the database for writing, so runs with a process pool ingest from the parent
+
+    :return: LineHistory
+    """
+
+    global _line_history
+
+    with _line_history_lock:
+        if _line_history is None:
+            _line_history = LineHistory(os.path.join(get_base_directory(), "line_history.duckdb"))
+
+    return _line_history
@@ -0,0 +1,226 @@
+import os
+import pandas as pd
+from utility.helper_functions import get_base_directory
+from utility.logging_utils import create_logger
+
+
+logger = create_logger(name=__name__)
+
+# Directory levels of the store, e.g. website=bovada/sport=basketball/date=2024-01-31/uid_timestamp=20240131120000
+PARTITION_COLUMNS = ["website", "sport", "date", "uid_timestamp"]
+
+# Type of every column of the store, so that every file has the same schema whichever website wrote it.
+# A column that is always None for a website (e.g. american_line for Betfair) would otherwise be written
+# with the null type and conflict with the files of the other websites
+LINE_COLUMN_TYPES = [
+    ("event_id", "string"),
+    ("event_date", "dictionary"),
+    ("data_competition", "dictionary"),
+    ("away_team", "dictionary"),
+    ("home_team", "dictionary"),
+    ("event_key", "int64"),
+    ("away_team_key", "int64"),
+    ("home_team_key", "int64"),
+    ("bet_type", "dictionary"),
+    ("team", "dictionary"),
+    ("american_line", "string"),
+    ("decimal_line", "float64"),
+    ("fractional_line", "string"),
+    ("handicap_spread", "float64"),
+    ("over_under", "dictionary"),
+    ("team_key", "int64")
+]
+
+
+class LineStore:
+    def __init__(
+            self,
+            store_directory: str,
+            compression: str="zstd"
+    ):
+        """
+        Parsed lines of every run, appended as compressed Parquet files partitioned by website/sport/date/uid_timestamp
+
+        Reads only open the partitions matching the filters and decode only the requested columns (requires pyarrow)
+
+        :param store_directory: root directory of the partitioned dataset
+        :param compression: Parquet compression codec
+        """
+
+        self.store_directory = store_directory
+        self.compression = compression
+
+        os.makedirs(store_directory, exist_ok=True)
+
+    @staticmethod
+    def schema():
+        """
+        Schema of the store, the line columns followed by the partition columns
+
+        :return: pyarrow Schema
+        """
+
+        import pyarrow as pa
+
+        arrow_types = {
+            "string": pa.string(),
+            "dictionary": pa.dictionary(pa.int32(), pa.string()),
+            "int64": pa.int64(),
+            "float64": pa.float64()
+        }
+
+        return pa.schema(
+            [pa.field(column, arrow_types[column_type]) for column, column_type in LINE_COLUMN_TYPES]
+            + [pa.field(column, pa.string()) for column in PARTITION_COLUMNS]
+        )
+
+    @staticmethod
+    def partitioning():
+        """
+        Hive partitioning of the store, with every partition value read back as a string
+
+        :return: pyarrow Partitioning
+        """
+
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        return ds.partitioning(pa.schema([(column, pa.string()) for column in PARTITION_COLUMNS]), flavor="hive")
+
+    def write(
+            self,
+            df_bet_info: pd.DataFrame,
+            website: str,
+            sport: str,
+            uid_timestamp
+    ):
+        """
+        Append the lines of a single run
+
+        Writing the same website / sport / uid_timestamp again (e.g. a replay) replaces that run's file
+
+        :param df_bet_info: dataframe with lines as produced by create_df_with_lines
+        :param website: website the lines are from
+        :param sport: sport of the lines
+        :param uid_timestamp: YYYYMMDDHHMMSS timestamp of the run
+        :return: directory of the run's partition
+        """
+
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        uid_timestamp = str(uid_timestamp)
+        run_date = f"{uid_timestamp[:4]}-{uid_timestamp[4:6]}-{uid_timestamp[6:8]}"
+
+        schema = self.schema()
+        df_partition = df_bet_info.drop(columns=["website"], errors="ignore").assign(
+            website=website,
+            sport=sport,
+            date=run_date,
+            uid_timestamp=uid_timestamp
+        )
+        # Columns a website does not produce are stored as nulls
+        df_partition = df_partition.reindex(columns=schema.names)
+        table = pa.Table.from_pandas(df_partition, preserve_index=False).cast(schema)
+
+        ds.write_dataset(
+            table,
+            self.store_directory,
+            format="parquet",
+            partitioning=self.partitioning(),
+            basename_template="lines-{i}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            file_options=ds.ParquetFileFormat().make_write_options(compression=self.compression)
+        )
+
+        partition_directory = os.path.join(
+            self.store_directory, *(f"{column}={value}" for column, value in zip(PARTITION_COLUMNS, [website, sport, run_date, uid_timestamp]))
+        )
+        logger.info(f"{len(df_bet_info)} lines written to {partition_directory}")
+
+        return partition_directory
+
+    def read(
+            self,
+            columns: list=None,
+            filters=None
+    ):
+        """
+        Read lines from the store
+
+        Filters on partition columns skip whole directories, filters on other columns skip row groups using
+        the Parquet statistics, and only the requested columns are decoded
+
+        :param columns: columns to read, all columns when None
+        :param filters: pyarrow expression or list of (column, op, value) tuples, e.g.
+            [("website", "=", "bovada"), ("date", ">=", "2024-01-01"), ("bet_type", "=", "moneyline")]
+        :return: pandas dataframe of the matching lines
+        """
+
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+
+        if filters is not None and not isinstance(filters, ds.Expression):
+            filters = pq.filters_to_expression(filters)
+
+        dataset = ds.dataset(self.store_directory, format="parquet", schema=self.schema(), partitioning=self.partitioning())
+
+        return dataset.to_table(columns=columns, filter=filters).to_pandas()
+
+    def uid_timestamps(
+            self,
+            website: str,
+            sport: str
+    ):
+        """
+        List the runs stored for a website / sport from the partition directories, without opening any file
+
+        :param website: website of the runs
+        :param sport: sport of the runs
+        :return: sorted list of uid_timestamps
+        """
+
+        sport_directory = os.path.join(self.store_directory, f"website={website}", f"sport={sport}")
+        if not os.path.isdir(sport_directory):
+            return []
+
+        uid_timestamps = []
+        for date_directory in os.listdir(sport_directory):
+            for uid_timestamp_directory in os.listdir(os.path.join(sport_directory, date_directory)):
+                uid_timestamps.append(uid_timestamp_directory.split("=", 1)[1])
+
+        return sorted(uid_timestamps)
+
+    def read_latest(
+            self,
+            website: str,
+            sport: str,
+            columns: list=None
+    ):
+        """
+        Read the lines of the most recent run of a website / sport
+
+        :param website: website of the run
+        :param sport: sport of the run
+        :param columns: columns to read, all columns when None
+        :return: pandas dataframe of the lines, None if the website / sport has no runs stored
+        """
+
+        uid_timestamps = self.uid_timestamps(website, sport)
+        if len(uid_timestamps) == 0:
+            return None
+
+        return self.read(
+            columns=columns,
+            filters=[("website", "=", website), ("sport", "=", sport), ("uid_timestamp", "=", uid_timestamps[-1])]
+        )
+
+
+def get_line_store():
+    """
+    Retrieve the line store in the base directory
+
+    :return: LineStore
+    """
+
+    return LineStore(os.path.join(get_base_directory(), "lines"))
@@ -1,30 +1,198 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import multiprocessing.util
+import os
+import queue
+import random
 import sys
+from utility.config import get_config
 
 # formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 formatter = logging.Formatter("%(asctime)s | %(levelname)s | %(message)s")
 
+
+_logging_configured = False
+_queue_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        """
+        Format the record as a single line json object
+
+        :param record: log record
+        :return: json string
+        """
+
+        log_record = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            log_record["exc_info"] = self.formatException(record.exc_info)
+
+        return json.dumps(log_record, default=str)
+
+
+class ModuleFormatter(logging.Formatter):
+    def __init__(
+            self,
+            json_loggers: list
+    ):
+        """
+        Formatter that writes json for the given loggers (and their children) and plain text for the rest
+
+        :param json_loggers: names of the loggers, e.g. "betfair.betfair", that should be formatted as json
+        """
+
+        super().__init__()
+        self.json_loggers = tuple(json_loggers)
+        self.json_formatter = JsonFormatter()
+
+    def format(self, record):
+        if any(record.name == name or record.name.startswith(f"{name}.") for name in self.json_loggers):
+            return self.json_formatter.format(record)
+
+        return formatter.format(record)
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(
+            self,
+            debug_sample_rate: float
+    ):
+        """
+        Keep only a random sample of DEBUG records, every record above DEBUG is kept
+
+        :param debug_sample_rate: fraction (0 to 1) of DEBUG records to keep
+        """
+
+        super().__init__()
+        self.debug_sample_rate = debug_sample_rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.debug_sample_rate
+
+
+def stop_queue_listener():
+    """
+    Stop the background log listener, writing out any records still queued
+
+    :return: None
+    """
+
+    global _queue_listener
+
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
+def restart_queue_listener_in_child():
+    """
+    Give a forked child process its own queue and listener thread, since threads are not copied by fork
+
+    :return: None
+    """
+
+    global _queue_listener
+
+    if _queue_listener is None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.handlers.QueueHandler):
+            handler.queue = log_queue
+
+    _queue_listener = logging.handlers.QueueListener(log_queue, *_queue_listener.handlers, respect_handler_level=True)
+    _queue_listener.start()
+
+    # Pool worker processes exit without running atexit, but do run multiprocessing finalizers
+    multiprocessing.util.Finalize(None, stop_queue_listener, exitpriority=0)
+
+
+def configure_logging(
+        file_path: str=None,
+        level: str=None,
+        use_queue: bool=None,
+        json_loggers: list=None,
+        debug_sample_rate: float=None
+):
+    """
+    Configure the root logger, with any setting not provided read from constants/logging.json
+
+    :param file_path: full file path to where logs are output
+    :param level: level name, e.g. INFO or DEBUG
+    :param use_queue: True to hand records to a background thread through a QueueHandler so that
+        writing the logs never blocks the caller
+    :param json_loggers: names of the loggers (module names) whose records are written as json
+    :param debug_sample_rate: fraction (0 to 1) of DEBUG records to keep
+    :return: None
+    """
+
+    global _logging_configured, _queue_listener
+
+    logging_config = get_config("logging.json")
+
+    level = level if level is not None else logging_config.level
+    use_queue = use_queue if use_queue is not None else logging_config.use_queue
+    json_loggers = json_loggers if json_loggers is not None else logging_config.json_loggers
+    debug_sample_rate = debug_sample_rate if debug_sample_rate is not None else logging_config.debug_sample_rate
+
+    stop_queue_listener()
+
+    handlers = [logging.StreamHandler(stream=sys.stderr)]
+    if file_path is not None:
+        handlers.append(logging.FileHandler(file_path, mode="w"))
+    for handler in handlers:
+        handler.setFormatter(ModuleFormatter(json_loggers))
+
+    sampling_filter = SamplingFilter(debug_sample_rate)
+
+    logger = logging.getLogger()
+    logger.handlers = []
+
+    if use_queue is True:
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.addFilter(sampling_filter)
+        logger.addHandler(queue_handler)
+
+        _queue_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _queue_listener.start()
+    else:
+        for handler in handlers:
+            handler.addFilter(sampling_filter)
+            logger.addHandler(handler)
+
+    logger.setLevel(level)
+    _logging_configured = True
+
+
 def create_logger(
-        file_path: str=None
+        file_path: str=None,
+        name: str=None
 ):
     """
     Create logger which will stream logs to console
 
+    Logging is configured once per process (or again when a file_path is given)
+
     file_path: full file path to where logs are output
+    name: name of the logger, usually __name__ of the module
     return: logger
     """
 
-    logger = logging.getLogger()
-    logger.handlers = []
-    sh = logging.StreamHandler(stream=sys.stderr)
-    sh.setFormatter(formatter)
-    logger.addHandler(sh)
+    if _logging_configured is False or file_path is not None:
+        configure_logging(file_path=file_path)
+
+    return logging.getLogger(name)
 
-    if file_path is not None:
-        sh_file = logging.FileHandler(file_path, mode="w")
-        sh_file.setFormatter(formatter)
-        logger.addHandler(sh_file)
 
-    logger.setLevel(logging.INFO)
-    
-    return logger
+atexit.register(stop_queue_listener)
+os.register_at_fork(after_in_child=restart_queue_listener_in_child)
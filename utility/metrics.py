@@ -0,0 +1,129 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from utility.logging_utils import create_logger
+
+
+logger = create_logger(name=__name__)
+
+
+def get_peak_rss_bytes():
+    """
+    Retrieve the peak resident set size of the process so far
+
+    :return: peak RSS in bytes, or None where the resource module is not available (Windows)
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+class RunMetrics:
+    def __init__(
+            self,
+            run_name: str
+    ):
+        """
+        Timing spans for the stages of a single run
+
+        :param run_name: name of the run, e.g. bovada/basketball
+        """
+
+        self.run_name = run_name
+        self.started_at = datetime.now().isoformat()
+        self.spans = []
+        # Extra run level information included in the report
+        self.attributes = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(
+            self,
+            name: str
+    ):
+        """
+        Time a stage of the run
+
+        The caller can set "bytes_fetched" and "records" on the yielded dict.
+        thread_cpu_seconds is the CPU time of the thread that ran the span, which leaves out the work the span hands
+        to a thread or process pool. process_cpu_seconds is the CPU time of the whole process, which includes the
+        other jobs running at the same time. peak_rss_bytes is the peak of the process so far
+
+        :param name: name of the stage, e.g. fetch or parse
+        :return: dict describing the span
+        """
+
+        span = {
+            "name": name,
+            "bytes_fetched": 0,
+            "records": 0
+        }
+        start_wall = time.perf_counter()
+        start_thread_cpu = time.thread_time()
+        start_process_cpu = time.process_time()
+
+        try:
+            yield span
+        finally:
+            span["wall_seconds"] = time.perf_counter() - start_wall
+            span["thread_cpu_seconds"] = time.thread_time() - start_thread_cpu
+            span["process_cpu_seconds"] = time.process_time() - start_process_cpu
+            span["peak_rss_bytes"] = get_peak_rss_bytes()
+
+            with self.lock:
+                self.spans.append(span)
+
+            logger.info(
+                f"{self.run_name} span {name} : wall = {span['wall_seconds']:.3f}s, "
+                f"thread cpu = {span['thread_cpu_seconds']:.3f}s, process cpu = {span['process_cpu_seconds']:.3f}s, "
+                f"bytes_fetched = {span['bytes_fetched']}, records = {span['records']}"
+            )
+
+    def to_dict(self):
+        """
+        Machine readable report of the run
+
+        :return: dict with the run name, start time, every span and the run attributes
+        """
+
+        with self.lock:
+            spans = list(self.spans)
+
+        return {
+            "run_name": self.run_name,
+            "started_at": self.started_at,
+            "spans": spans,
+            **self.attributes
+        }
+
+    def write(
+            self,
+            directory: str,
+            file_name: str="metrics.json"
+    ):
+        """
+        Write the report of the run to a json file
+
+        :param directory: directory to write the file to, usually the uid_timestamp directory of the run
+        :param file_name: name of the file
+        :return: full file path of the report
+        """
+
+        file_path = os.path.join(directory, file_name)
+        with open(file_path, "w") as f:
+            f.write(json.dumps(self.to_dict(), indent=2))
+
+        logger.info(f"Metrics written to {file_path}")
+
+        return file_path
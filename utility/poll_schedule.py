@@ -0,0 +1,82 @@
+import threading
+import time
+from utility.logging_utils import create_logger
+
+
+logger = create_logger(name=__name__)
+
+
+class PollSchedule:
+    def __init__(
+            self,
+            intervals_config
+    ):
+        """
+        Adaptive interval between the polls of a single website / sport
+
+        The interval shrinks while the lines move and grows while the payload comes back unchanged or the
+        website errors, within [min_interval_seconds, max_interval_seconds]. It never drops below
+        latency_multiplier times the duration of the last poll, so a slow website is not polled back to back
+
+        :param intervals_config: PollIntervalConfig of the website
+        """
+
+        self.intervals_config = intervals_config
+        self.interval_seconds = intervals_config.initial_interval_seconds
+        self.next_poll_time = time.monotonic()
+        self.polls = 0
+        self.consecutive_errors = 0
+        self.lock = threading.Lock()
+
+    def is_due(
+            self,
+            now: float
+    ):
+        """
+        Whether the website / sport should be polled
+
+        :param now: time.monotonic() value
+        :return: True if the next poll time has passed
+        """
+
+        return now >= self.next_poll_time
+
+    def record(
+            self,
+            lines_changed: bool=None,
+            seconds: float=None,
+            error: bool=False
+    ):
+        """
+        Adapt the interval to the outcome of a poll and schedule the next one
+
+        :param lines_changed: True if any price moved since the previous poll, False if the payload was unchanged,
+            None if it is not known (e.g. the line history could not be updated)
+        :param seconds: how long the poll took
+        :param error: True if the poll failed
+        :return: interval in seconds until the next poll
+        """
+
+        config = self.intervals_config
+
+        with self.lock:
+            self.polls += 1
+
+            if error is True:
+                self.consecutive_errors += 1
+                self.interval_seconds *= config.error_backoff_factor
+            else:
+                self.consecutive_errors = 0
+                # Every line is new on the first poll, which says nothing about how fast the lines move
+                if self.polls > 1 and lines_changed is True:
+                    self.interval_seconds *= config.speedup_factor
+                elif self.polls > 1 and lines_changed is False:
+                    self.interval_seconds *= config.backoff_factor
+
+            self.interval_seconds = min(max(self.interval_seconds, config.min_interval_seconds), config.max_interval_seconds)
+            if seconds is not None:
+                self.interval_seconds = max(self.interval_seconds, config.latency_multiplier * seconds)
+
+            self.next_poll_time = time.monotonic() + self.interval_seconds
+
+            return self.interval_seconds
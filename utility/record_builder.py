@@ -0,0 +1,115 @@
+import math
+from array import array
+import numpy as np
+import pandas as pd
+
+
+# Columns stored in a contiguous array, by pandas dtype
+ARRAY_TYPECODES = {
+    "float64": "d",
+    "int64": "q"
+}
+
+class ColumnarRecordBuilder:
+    def __init__(
+            self,
+            headers: list,
+            column_dtypes: dict
+    ):
+        """
+        Collect records straight into one typed buffer per column instead of a list of lists
+
+        float64 and int64 columns are stored in a contiguous array of doubles / 64 bit integers, every other
+        column in a list that is converted to its dtype (e.g. category) once when the dataframe is built
+
+        :param headers: column names in the order values appear in each record
+        :param column_dtypes: dict of column name to pandas dtype (float64, int64, category or object)
+        """
+
+        self.headers = headers
+        self.column_dtypes = {header: column_dtypes.get(header, "object") for header in headers}
+        self.columns = [
+            array(ARRAY_TYPECODES[self.column_dtypes[header]]) if self.column_dtypes[header] in ARRAY_TYPECODES else []
+            for header in headers
+        ]
+        self.float_columns = [self.column_dtypes[header] == "float64" for header in headers]
+
+    def __len__(self):
+        return len(self.columns[0]) if len(self.columns) > 0 else 0
+
+    @staticmethod
+    def to_float(value):
+        """
+        Convert a scraped value (e.g. "1.91", "+5.5" or None) to a float
+
+        :param value: value to convert
+        :return: float, or nan if the value is missing or not numeric
+        """
+
+        if value is None:
+            return math.nan
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return math.nan
+
+    def append(
+            self,
+            record: list
+    ):
+        """
+        Add a single record, with values in the same order as headers
+
+        :param record: list of values
+        :return: None
+        """
+
+        # zip would silently drop the missing values and shift every later row of those columns
+        if len(record) != len(self.headers):
+            raise ValueError(f"Record has {len(record)} values but there are {len(self.headers)} columns : {record}")
+
+        for column, is_float, value in zip(self.columns, self.float_columns, record):
+            column.append(self.to_float(value) if is_float else value)
+
+    def extend(
+            self,
+            records
+    ):
+        """
+        Add every record of an iterable
+
+        :param records: iterable of lists of values
+        :return: None
+        """
+
+        for record in records:
+            self.append(record)
+
+    def to_dataframe(self):
+        """
+        Build a dataframe with the configured dtype for every column
+
+        :return: pandas dataframe
+        """
+
+        data = {}
+        for header, column in zip(self.headers, self.columns):
+            dtype = self.column_dtypes[header]
+            if dtype in ARRAY_TYPECODES:
+                # Copy out of the array buffer so the builder can keep appending afterwards
+                data[header] = pd.Series(np.frombuffer(column, dtype=dtype).copy())
+            else:
+                data[header] = pd.Series(column, dtype=dtype)
+
+        return pd.DataFrame(data, columns=self.headers)
+
+    def to_arrow(self):
+        """
+        Build an Arrow table, with category columns stored as dictionary arrays (requires pyarrow)
+
+        :return: pyarrow Table
+        """
+
+        import pyarrow as pa
+
+        return pa.Table.from_pandas(self.to_dataframe(), preserve_index=False)
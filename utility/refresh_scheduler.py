@@ -0,0 +1,165 @@
+import threading
+import time
+from utility.logging_utils import create_logger
+
+
+logger = create_logger(name=__name__)
+
+# Events whose start time is unknown are refreshed as if they started this far out
+UNKNOWN_MINUTES_TO_START = 24 * 60
+
+
+class RefreshScheduler:
+    def __init__(
+            self,
+            refresh_config
+    ):
+        """
+        Priority of the per-event page refreshes of a website, so that a limited request budget goes to the
+        events whose prices actually change
+
+        Each event is due for a refresh once its page is older than its refresh interval, which grows with the
+        time left before the event starts. Due events are ranked by how overdue they are, weighted by how much
+        their prices moved in recent refreshes, and only the first request_budget of them are refreshed.
+        Events that were never fetched always come first since there is no earlier page to fall back on
+
+        :param refresh_config: EventRefreshConfig of the website
+        """
+
+        self.refresh_config = refresh_config
+        # event_id to dict with the fetch time and body digest of its last page, its prices and volatility
+        self.events = {}
+        self.lock = threading.Lock()
+
+    def refresh_interval(
+            self,
+            minutes_to_start: float=None
+    ):
+        """
+        Retrieve how long the page of an event is considered fresh
+
+        :param minutes_to_start: minutes until the event starts, None if unknown
+        :return: refresh interval in seconds
+        """
+
+        config = self.refresh_config
+        minutes_to_start = minutes_to_start if minutes_to_start is not None else UNKNOWN_MINUTES_TO_START
+
+        return min(
+            max(minutes_to_start * config.refresh_seconds_per_minute_to_start, config.min_refresh_seconds),
+            config.max_refresh_seconds
+        )
+
+    def priority(
+            self,
+            event_id: str,
+            minutes_to_start: float=None,
+            now: float=None
+    ):
+        """
+        Retrieve the refresh priority of an event, an event is due once it reaches 1
+
+        :param event_id: id of the event
+        :param minutes_to_start: minutes until the event starts, None if unknown
+        :param now: time.time() value, defaults to the current time
+        :return: age of the page over its refresh interval, times (1 + volatility). inf if never fetched
+        """
+
+        now = now if now is not None else time.time()
+
+        with self.lock:
+            event = self.events.get(event_id)
+
+        if event is None or event["digest"] is None:
+            return float("inf")
+
+        age_seconds = now - event["fetch_time"]
+
+        return age_seconds / self.refresh_interval(minutes_to_start) * (1 + event["volatility"])
+
+    def select(
+            self,
+            events: list,
+            now: float=None
+    ):
+        """
+        Split events between the pages to refresh, in priority order, and the pages to reuse
+
+        :param events: list of (event_id, minutes_to_start) tuples
+        :param now: time.time() value, defaults to the current time
+        :return: list of the event_ids to refresh, highest priority first, and dict of the event_ids whose
+            last page is reused to the digest of that page
+        """
+
+        now = now if now is not None else time.time()
+        request_budget = self.refresh_config.request_budget
+
+        priorities = {event_id: self.priority(event_id, minutes_to_start, now) for event_id, minutes_to_start in events}
+        due = sorted((event_id for event_id in priorities if priorities[event_id] >= 1), key=lambda event_id: -priorities[event_id])
+        refresh = due if request_budget is None else due[:request_budget]
+
+        with self.lock:
+            reuse = {
+                event_id: self.events[event_id]["digest"]
+                for event_id in priorities
+                if event_id not in refresh and priorities[event_id] != float("inf")
+            }
+
+        skipped = [event_id for event_id in due if event_id not in refresh and event_id not in reuse]
+        if len(skipped) > 0:
+            logger.info(f"{len(skipped)} events never fetched are left out by the request budget : {skipped}")
+
+        return refresh, reuse
+
+    def record_fetch(
+            self,
+            event_id: str,
+            digest: str,
+            prices: dict,
+            now: float=None
+    ):
+        """
+        Remember a refreshed page of an event and how many of its prices moved since the last refresh
+
+        :param event_id: id of the event
+        :param digest: sha256 hex digest of the page body
+        :param prices: dict of market side to decimal price parsed from the page
+        :param now: time.time() value, defaults to the current time
+        :return: number of prices that moved
+        """
+
+        now = now if now is not None else time.time()
+
+        with self.lock:
+            event = self.events.get(event_id)
+            if event is None:
+                changed_prices = 0
+                volatility = 0.0
+            else:
+                changed_prices = sum(1 for side, price in prices.items() if event["prices"].get(side) != price)
+                volatility = event["volatility"] * self.refresh_config.volatility_decay + changed_prices
+
+            self.events[event_id] = {
+                "fetch_time": now,
+                "digest": digest,
+                "prices": prices,
+                "volatility": volatility
+            }
+
+        return changed_prices
+
+    def retain(
+            self,
+            event_ids
+    ):
+        """
+        Drop the events no longer listed, e.g. once they started
+
+        :param event_ids: ids of the events to keep
+        :return: None
+        """
+
+        event_ids = set(event_ids)
+        with self.lock:
+            for event_id in [event_id for event_id in self.events if event_id not in event_ids]:
+                del self.events[event_id]
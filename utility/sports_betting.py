@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
 from datetime import datetime
 import os
-from utility.helper_functions import create_directory
+from utility.helper_functions import create_directory, get_base_directory
+from utility.metrics import RunMetrics
 
 
 class SportsBetting(ABC):
@@ -10,8 +11,14 @@ class SportsBetting(ABC):
             sport: str
     ):
         self.sport = sport
-        self.sports_arbitrage_data_directory = os.path.join(os.path.expanduser('~'), "sports_arbitrage_data")
+        self.sports_arbitrage_data_directory = get_base_directory()
         self.output_directory = os.path.join(self.sports_arbitrage_data_directory, "output")
+        # Result of the last all_games download: body digest, whether it changed and status code
+        self.all_games_snapshot = None
+        # YYYYMMDDHHMMSS timestamp of the last run of create_df_with_lines
+        self.uid_timestamp = None
+        # Timing spans of the stages of the current run, reset by create_df_with_lines
+        self.metrics = RunMetrics(sport)
 
         create_directory(
             self.output_directory, 
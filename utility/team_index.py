@@ -0,0 +1,214 @@
+import json
+import os
+import re
+import threading
+import zlib
+from datetime import date
+from pathlib import Path
+from utility.logging_utils import create_logger
+from utility.helper_functions import get_base_directory
+
+
+logger = create_logger(name=__name__)
+
+TEAM_ALIASES_PATH = f"{Path(__file__).parents[1]}/constants/team_aliases.json"
+
+# team_key of lines without a team, e.g. over/under
+NO_TEAM_KEY = -1
+
+# Names that match no alias get a key derived from their normalized text, in the range
+# [UNKNOWN_TEAM_KEY_OFFSET, TEAM_KEY_LIMIT) so they never collide with the configured keys.
+# Two names with the same derived key are told apart by unknown_teams of the cache
+UNKNOWN_TEAM_KEY_OFFSET = 100000
+TEAM_KEY_LIMIT = 1000000
+
+_team_index = None
+_team_index_lock = threading.Lock()
+
+# Everything that is not a letter, digit or space is dropped when normalizing names
+_team_name_pattern = re.compile(r"[^a-z0-9 ]")
+
+
+class TeamIndex:
+    def __init__(
+            self,
+            aliases_file_path: str,
+            cache_file_path: str
+    ):
+        """
+        Map the team names of every website to a canonical integer team_key
+
+        The normalized alias map built from team_aliases.json and the names that matched no alias are cached
+        on disk, and rebuilt whenever team_aliases.json changes
+
+        :param aliases_file_path: full file path of team_aliases.json
+        :param cache_file_path: full file path of the on-disk cache
+        """
+
+        self.aliases_file_path = aliases_file_path
+        self.cache_file_path = cache_file_path
+        self.aliases_mtime = os.path.getmtime(aliases_file_path)
+        self.lock = threading.Lock()
+        # True once a name that matched no alias was added since the cache was last saved
+        self.changed = False
+
+        cache = None
+        if os.path.exists(cache_file_path):
+            with open(cache_file_path) as f:
+                cache = json.loads(f.read())
+
+        if cache is not None and cache.get("aliases_mtime") == self.aliases_mtime:
+            self.aliases = cache["aliases"]
+            self.unknown_teams = cache["unknown_teams"]
+        else:
+            with open(aliases_file_path) as f:
+                teams = json.loads(f.read())["teams"]
+
+            self.aliases = {}
+            for team in teams:
+                for name in [team["team"]] + team["aliases"]:
+                    self.aliases[self.normalize_team_name(name)] = team["team_key"]
+            self.unknown_teams = {}
+            self.save()
+
+        # Raw name to team_key, so each distinct name is only normalized once per process
+        self.team_keys = {}
+        # Keys already given to names that matched no alias, so that two names never share a key
+        self.unknown_team_keys = set(self.unknown_teams.values())
+
+    @staticmethod
+    def normalize_team_name(team_name: str):
+        """
+        Normalize a team name so that differences in case, punctuation and spacing do not matter
+
+        :param team_name: team name as shown on a website, e.g. "L.A. Lakers"
+        :return: normalized name, e.g. "la lakers"
+        """
+
+        team_name = _team_name_pattern.sub("", team_name.lower().replace("&", " and "))
+
+        return " ".join(team_name.split())
+
+    def team_key(
+            self,
+            team_name: str
+    ):
+        """
+        Retrieve the integer key of a team name
+
+        :param team_name: team name as shown on a website, or None for lines without a team
+        :return: team_key, NO_TEAM_KEY when there is no team
+        """
+
+        if team_name is None:
+            return NO_TEAM_KEY
+
+        team_key = self.team_keys.get(team_name)
+        if team_key is not None:
+            return team_key
+
+        normalized_team_name = self.normalize_team_name(team_name)
+        team_key = self.aliases.get(normalized_team_name)
+        if team_key is None:
+            with self.lock:
+                team_key = self.unknown_teams.get(normalized_team_name)
+                if team_key is None:
+                    team_key = self.unknown_team_key(normalized_team_name)
+                    logger.info(f"Team {team_name!r} matches no alias in team_aliases.json, using team_key = {team_key}")
+                    self.unknown_teams[normalized_team_name] = team_key
+                    self.unknown_team_keys.add(team_key)
+                    self.changed = True
+
+        self.team_keys[team_name] = team_key
+
+        return team_key
+
+    def unknown_team_key(
+            self,
+            normalized_team_name: str
+    ):
+        """
+        Choose the key of a name that matched no alias (caller must hold the lock)
+
+        The key is derived from the name, and moved on to the next free key if another name already has it
+
+        :param normalized_team_name: normalized team name
+        :return: team_key in [UNKNOWN_TEAM_KEY_OFFSET, TEAM_KEY_LIMIT) not given to any other name
+        """
+
+        key_range = TEAM_KEY_LIMIT - UNKNOWN_TEAM_KEY_OFFSET
+        offset = zlib.crc32(normalized_team_name.encode("utf-8")) % key_range
+        for probe in range(key_range):
+            team_key = UNKNOWN_TEAM_KEY_OFFSET + (offset + probe) % key_range
+            if team_key not in self.unknown_team_keys:
+                if probe > 0:
+                    logger.info(f"team_key of {normalized_team_name!r} collides with another unknown team, "
+                                f"using team_key = {team_key}")
+                return team_key
+
+        raise ValueError(f"No team_key left for {normalized_team_name!r}, {len(self.unknown_teams)} unknown teams")
+
+    @staticmethod
+    def event_key(
+            event_date: str,
+            away_team_key: int,
+            home_team_key: int
+    ):
+        """
+        Build the integer key of an event, the same on every website
+
+        :param event_date: YYYY-MM-DD date of the event
+        :param away_team_key: team_key of the away team
+        :param home_team_key: team_key of the home team
+        :return: days since 1970-01-01, away_team_key and home_team_key packed into a single int64
+        """
+
+        days = (date.fromisoformat(event_date) - date(1970, 1, 1)).days
+
+        return (days * TEAM_KEY_LIMIT + away_team_key) * TEAM_KEY_LIMIT + home_team_key
+
+    def save_changes(self):
+        """
+        Save the cache if names that matched no alias were added, meant to be called once per parse
+
+        :return: None
+        """
+
+        with self.lock:
+            if self.changed is True:
+                self.save()
+                self.changed = False
+
+    def save(self):
+        """
+        Write the alias map and the unknown team names to the on-disk cache (caller must hold the lock once
+        the index is shared)
+
+        :return: None
+        """
+
+        os.makedirs(os.path.dirname(self.cache_file_path), exist_ok=True)
+        temp_cache_file_path = f"{self.cache_file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_cache_file_path, "w") as f:
+            f.write(json.dumps({
+                "aliases_mtime": self.aliases_mtime,
+                "aliases": self.aliases,
+                "unknown_teams": self.unknown_teams
+            }))
+        os.replace(temp_cache_file_path, self.cache_file_path)
+
+
+def get_team_index():
+    """
+    Retrieve the TeamIndex shared by the whole process, creating it on first use
+
+    :return: TeamIndex
+    """
+
+    global _team_index
+
+    with _team_index_lock:
+        if _team_index is None:
+            _team_index = TeamIndex(TEAM_ALIASES_PATH, os.path.join(get_base_directory(), "team_index.json"))
+
+    return _team_index
@@ -0,0 +1,208 @@
+import argparse
+import os
+import secrets
+import time
+from multiprocessing.connection import Listener, Client
+from utility.config import get_config, get_config_registry
+from utility.helper_functions import get_base_directory
+from utility.logging_utils import create_logger
+
+logger = create_logger(name=__name__)
+
+AUTHKEY_ENVIRONMENT_VARIABLE = "SPORTS_BETTING_WORKER_AUTHKEY"
+
+
+def serve(
+        host: str,
+        port: int,
+        authkey: str
+):
+    """
+    Run a resident worker that polls the websites whenever it is triggered
+
+    The interpreter, imports, website instances, HTTP session and quote book stay warm between polls,
+    so a poll only pays for the requests and the parsing
+
+    :param host: host to listen on
+    :param port: port to listen on
+    :param authkey: key clients must authenticate with
+    :return: None
+    """
+
+    import sports_betting
+    from arbitrage.quote_book import QuoteBook
+    from utility.http_client import get_http_client
+
+    for website, website_config in get_config("betting_sites_info.json").items():
+        for sport in website_config.sports:
+            sports_betting.get_sports_betting(website, sport)
+    get_http_client()
+    quote_book = QuoteBook()
+
+    with Listener((host, port), authkey=authkey.encode("utf-8")) as listener:
+        logger.info(f"Worker listening on {host}:{port}")
+
+        stopped = False
+        while stopped is False:
+            # A client that fails to authenticate, hangs up or sends something unexpected must not stop the worker
+            try:
+                with listener.accept() as connection:
+                    request = connection.recv()
+                    logger.info(f"Worker request = {request}")
+
+                    if not isinstance(request, dict):
+                        connection.send({"status": "failure", "error": f"Request must be a dict, got {type(request).__name__}"})
+                        continue
+
+                    if request.get("command") == "stop":
+                        connection.send({"status": "stopped"})
+                        stopped = True
+                        continue
+
+                    connection.send(poll(sports_betting, quote_book, request))
+            except Exception as e:
+                logger.info(f"Worker connection failed : {e!r}")
+
+    logger.info("Worker stopped")
+
+
+def poll(
+        sports_betting,
+        quote_book,
+        request: dict
+):
+    """
+    Run a single poll for a request of the resident worker
+
+    :param sports_betting: sports_betting module
+    :param quote_book: QuoteBook kept by the worker
+    :param request: dict with website_filter, uid_timestamp and max_workers
+    :return: dict response with the status, seconds and per job summary of the poll
+    """
+
+    start_time = time.perf_counter()
+
+    # Edited config files are picked up between polls, never read during one
+    try:
+        reloaded = get_config_registry().reload_changed()
+        if len(reloaded) > 0:
+            logger.info(f"Reloaded config files {reloaded}")
+    except ValueError as e:
+        logger.info(f"Config not reloaded, keeping the previous one : {e}")
+
+    try:
+        results = sports_betting.main(
+            website_filter=request.get("website_filter"),
+            uid_timestamp=request.get("uid_timestamp"),
+            max_workers=request.get("max_workers"),
+            quote_book=quote_book
+        )
+        response = {
+            "status": "success",
+            "jobs": {
+                f"{website}/{sport}": {
+                    "status": result["status"],
+                    "error": result["error"],
+                    "seconds": result["seconds"],
+                    "lines": len(result["df"]) if result["df"] is not None else 0
+                }
+                for (website, sport), result in results.items()
+            },
+            "open_opportunities": len(quote_book.opportunities)
+        }
+    except Exception as e:
+        logger.info(f"Worker poll failed : {e!r}")
+        response = {
+            "status": "failure",
+            "error": repr(e)
+        }
+    response["seconds"] = time.perf_counter() - start_time
+
+    return response
+
+
+def get_authkey():
+    """
+    Retrieve the key the worker and its clients authenticate with
+
+    Connections unpickle what they receive, so the key must stay private to the user running the worker:
+    it is read from the SPORTS_BETTING_WORKER_AUTHKEY environment variable, or else from a random key
+    generated on first use in the base directory, readable by its owner only
+
+    :return: authkey string
+    """
+
+    authkey = os.environ.get(AUTHKEY_ENVIRONMENT_VARIABLE)
+    if authkey:
+        return authkey
+
+    authkey_file_path = os.path.join(get_base_directory(), "worker_authkey")
+    if not os.path.exists(authkey_file_path):
+        # The key is written in full before it is moved into place, so a client and the worker starting together
+        # never read a partial key, and whichever comes second keeps the key of the first
+        temp_authkey_file_path = f"{authkey_file_path}.{os.getpid()}.tmp"
+        file_descriptor = os.open(temp_authkey_file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(file_descriptor, "w") as f:
+            f.write(secrets.token_hex(32))
+        try:
+            # Unlike os.replace, a hard link never overwrites a key generated meanwhile
+            os.link(temp_authkey_file_path, authkey_file_path)
+            logger.info(f"Generated the worker authkey in {authkey_file_path}")
+        except FileExistsError:
+            logger.info(f"Worker authkey generated meanwhile in {authkey_file_path}, using it")
+        finally:
+            os.remove(temp_authkey_file_path)
+
+    with open(authkey_file_path) as f:
+        return f.read().strip()
+
+
+def trigger(
+        host: str,
+        port: int,
+        authkey: str,
+        request: dict
+):
+    """
+    Send a request to a resident worker and wait for its response
+
+    :param host: host the worker listens on
+    :param port: port the worker listens on
+    :param authkey: key the worker was started with
+    :param request: dict with website_filter, uid_timestamp and max_workers for a poll,
+        or {"command": "stop"} to stop the worker
+    :return: dict response of the worker
+    """
+
+    with Client((host, port), authkey=authkey.encode("utf-8")) as connection:
+        connection.send(request)
+        return connection.recv()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["serve", "poll", "stop"],
+                        help="serve runs the resident worker, poll triggers a poll of a running worker and stop stops it")
+    parser.add_argument("--website", dest="website_filter", required=False, type=str,
+                        help="Website to pull data from")
+    parser.add_argument("--uid-timestamp", dest="uid_timestamp", required=False, type=int,
+                        help="YYYYMMDDHHMMSS timestamp folder of a prior run to read files from instead of calling the websites")
+    parser.add_argument("--workers", dest="max_workers", required=False, type=int,
+                        help="Number of website/sport jobs run at the same time (defaults to all of them)")
+    args = parser.parse_args()
+
+    worker_config = get_config("worker.json")
+    address = (worker_config.host, worker_config.port, get_authkey())
+
+    if args.command == "serve":
+        serve(*address)
+    elif args.command == "poll":
+        response = trigger(*address, {
+            "website_filter": args.website_filter,
+            "uid_timestamp": args.uid_timestamp,
+            "max_workers": args.max_workers
+        })
+        logger.info(f"Worker response = {response}")
+    else:
+        response = trigger(*address, {"command": "stop"})
+        logger.info(f"Worker response = {response}")